@@ -0,0 +1,182 @@
+# benchmark.py
+# Офлайн-бенчмарки экранов бота на поддельных Jira и GitLab
+# Offline benchmarks of bot screens against fake Jira and GitLab
+#
+# Пример / Example:
+#   python benchmark.py --issues 200 --comment-size 2000 --latency 0.02 --output bench.json
+#   python benchmark.py --baseline bench.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Бот проверяет обязательные переменные при импорте; для бенчмарка подойдут любые
+for _name, _value in {"JIRA_URL": "http://jira.invalid", "JIRA_EMAIL": "bench@example.com",
+                      "JIRA_API_TOKEN": "bench", "GITLAB_PRIVATE_TOKEN": "bench",
+                      "BOT_TOKEN": "123456:bench-token", "STATE_DB": ":memory:"}.items():
+    os.environ.setdefault(_name, _value)
+
+import bot  # noqa: E402
+from fake_upstreams import FakeDataset, FakeUpstreams  # noqa: E402
+from state import SQLiteStateBackend  # noqa: E402
+
+
+class NullSender:
+    """Отправитель без Telegram: сообщения только считаются."""
+
+    def __init__(self):
+        self.messages = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> Any:
+        self.messages += 1
+        return None
+
+    async def edit_text(self, message: Any, text: str, **kwargs) -> Any:
+        self.messages += 1
+
+    async def call(self, chat_id: int, request: Callable[[], Awaitable[Any]], priority: int = 0) -> Any:
+        return None
+
+    async def close(self):
+        pass
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def reset_caches():
+    bot.issue_cache.clear()
+    bot.mr_cache.clear()
+    bot.auto_report_snapshots.clear()
+
+
+async def measure(upstreams: FakeUpstreams, call: Callable[[], Awaitable[Any]], iterations: int,
+                  cold: bool) -> Dict[str, Any]:
+    """Выполняет сценарий iterations раз и собирает задержки и число запросов к внешним сервисам."""
+    latencies: List[float] = []
+    upstreams.calls.clear()
+    for _ in range(iterations):
+        if cold:
+            reset_caches()
+        started = time.perf_counter()
+        await call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    calls = Counter(upstreams.calls)
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+        "upstream_calls": dict(sorted(calls.items())),
+        "upstream_calls_per_iteration": round(sum(calls.values()) / iterations, 2),
+    }
+
+
+async def run_benchmarks(dataset: FakeDataset, iterations: int, jira_latency: float,
+                         gitlab_latency: float) -> Dict[str, Any]:
+    upstreams = FakeUpstreams(dataset, jira_latency=jira_latency, gitlab_latency=gitlab_latency)
+    await upstreams.start()
+    upstreams.use_in(bot)
+    sender = NullSender()
+    bot.sender = sender
+    bot.state_backend = SQLiteStateBackend(":memory:")
+    bot.user_data[1] = {"chat_id": 1}
+
+    release_name = upstreams.versions[-1]["name"]
+    raw_issue = upstreams.issues[-1]
+    scenarios: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "show_release_details": lambda: bot.show_release_details(1, release_name),
+        "show_release_details_review": lambda: bot.show_release_details(1, release_name, show_review_only=True),
+        "send_releases_list": lambda: bot.send_releases_list(1),
+        "send_auto_report": lambda: bot.send_auto_report(1),
+        "get_services_from_issue": lambda: bot.get_services_from_issue(raw_issue),
+    }
+
+    results: Dict[str, Any] = {}
+    try:
+        for name, call in scenarios.items():
+            results[f"{name}.cold"] = await measure(upstreams, call, iterations, cold=True)
+            reset_caches()
+            await call()
+            results[f"{name}.warm"] = await measure(upstreams, call, iterations, cold=False)
+    finally:
+        await bot.http_client.close()
+        await upstreams.close()
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Строки сравнения p50/p99 и числа запросов с предыдущим запуском."""
+    lines = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        parts = []
+        for metric in ("p50_ms", "p99_ms", "upstream_calls_per_iteration"):
+            old, new = before.get(metric), current.get(metric)
+            if old:
+                parts.append(f"{metric} {old} → {new} ({(new - old) / old * 100:+.1f}%)")
+        lines.append(f"{name}: " + ", ".join(parts))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарки бота на поддельных Jira и GitLab")
+    parser.add_argument("--releases", type=int, default=20)
+    parser.add_argument("--issues", type=int, default=50, help="задач в каждом релизе")
+    parser.add_argument("--comments", type=int, default=3, help="комментариев в задаче")
+    parser.add_argument("--comment-size", type=int, default=300, help="символов в комментарии")
+    parser.add_argument("--mr-links", type=int, default=1, help="ссылок на MR в задаче")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Jira и GitLab, сек")
+    parser.add_argument("--gitlab-latency", type=float, default=None)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+    args = parser.parse_args(argv)
+
+    dataset = FakeDataset(releases=args.releases, issues_per_release=args.issues, comments_per_issue=args.comments,
+                          comment_size=args.comment_size, mr_links_per_issue=args.mr_links,
+                          mr_repo=str(bot.SERVICE_PATTERNS[0]["pattern"]), target_branch=bot.TARGET_BRANCH)
+    gitlab_latency = args.latency if args.gitlab_latency is None else args.gitlab_latency
+    results = asyncio.run(run_benchmarks(dataset, args.iterations, args.latency, gitlab_latency))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "dataset": vars(dataset),
+            "iterations": args.iterations,
+            "jira_latency": args.latency,
+            "gitlab_latency": gitlab_latency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, item in results.items():
+        print(f"{name:40} p50 {item['p50_ms']:9.2f} ms  p99 {item['p99_ms']:9.2f} ms  "
+              f"calls/iter {item['upstream_calls_per_iteration']}")
+    print(f"📄 Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            for line in compare(results, json.load(f)):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
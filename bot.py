@@ -5,20 +5,34 @@
 import asyncio
 import os
 import re
+import signal
+import socket
 import urllib.parse
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Any
 
 import aiohttp
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from dotenv import load_dotenv
 
+from cache import CacheEntry, MergeRequestCache, MergeRequestInfo, TTLCache
+from coalesce import SingleFlight
 from config import SERVICE_PATTERNS
+from matcher import ServiceMatcher
+from models import (Issue, IssueState, ReleaseSnapshot, ReleaseSummary, diff_snapshots, is_review_status,
+                    parse_rework, release_content_hash, summarize_issues)
+from release_index import ReleaseIndex
+from sender import PRIORITY_BACKGROUND, LiveMessage, MessageSender
+from state import RedisStateBackend, SQLiteStateBackend, StateBackend
+from upstream import UpstreamClient, UpstreamError, UpstreamSettings, latency_budget
+from webhook import create_webhook_app
 
 # Загружаем переменные окружения из .env
 load_dotenv()
@@ -29,9 +43,87 @@ JIRA_EMAIL = os.getenv("JIRA_EMAIL")
 JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
 PROJECT_KEY = os.getenv("JIRA_PROJECT_KEY", "BACK")
 GITLAB_PRIVATE_TOKEN = os.getenv("GITLAB_PRIVATE_TOKEN")
+GITLAB_API_URL = os.getenv("GITLAB_API_URL", "https://gitlab.com/api/v4")
 TARGET_BRANCH = os.getenv("TARGET_BRANCH", "main")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Настройки пулов HTTP-соединений
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "20"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+JIRA_TIMEOUT = float(os.getenv("JIRA_TIMEOUT", "10"))
+GITLAB_TIMEOUT = float(os.getenv("GITLAB_TIMEOUT", "10"))
+JIRA_CONCURRENCY = int(os.getenv("JIRA_CONCURRENCY", "5"))
+JIRA_PAGE_SIZE = int(os.getenv("JIRA_PAGE_SIZE", "100"))
+JIRA_BULK_RELEASES = int(os.getenv("JIRA_BULK_RELEASES", "20"))
+JIRA_CACHE_TTL = float(os.getenv("JIRA_CACHE_TTL", "60"))
+JIRA_CACHE_SIZE = int(os.getenv("JIRA_CACHE_SIZE", "128"))
+JIRA_CACHE_FULL_RELOAD = float(os.getenv("JIRA_CACHE_FULL_RELOAD", "900"))
+JIRA_STATUSES_TTL = 3600
+GITLAB_MR_CACHE_TTL_OPEN = float(os.getenv("GITLAB_MR_CACHE_TTL_OPEN", "300"))
+GITLAB_MR_CACHE_TTL_FINAL = float(os.getenv("GITLAB_MR_CACHE_TTL_FINAL", "604800"))
+GITLAB_MR_CACHE_DB = os.getenv("GITLAB_MR_CACHE_DB", "")
+GITLAB_CONCURRENCY = int(os.getenv("GITLAB_CONCURRENCY", "4"))
+GITLAB_IIDS_PER_REQUEST = 100
+
+# Устойчивость к сбоям Jira и GitLab: повторы с экспоненциальной задержкой и circuit breaker на хост
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.2"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "2"))
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))
+
+# Бюджеты времени экранов (сек) на все запросы к Jira и GitLab вместе с повторами
+RELEASES_LIST_BUDGET = float(os.getenv("RELEASES_LIST_BUDGET", "8"))
+RELEASE_REPORT_BUDGET = float(os.getenv("RELEASE_REPORT_BUDGET", "20"))
+AUTO_REPORT_BUDGET = float(os.getenv("AUTO_REPORT_BUDGET", "60"))
+
+# Фоновый прогрев: сколько свежих релизов держать в кэше и как часто обновлять (сек, 0 — только при старте)
+WARMUP_RELEASES = int(os.getenv("WARMUP_RELEASES", "5"))
+WARMUP_INTERVAL = float(os.getenv("WARMUP_INTERVAL", "120"))
+WARMUP_IDLE_DELAY = 0.5
+
+# Вебхуки Jira: порт приёмника (0 — выключен), путь, секрет подписи и период сверки индекса (сек)
+JIRA_WEBHOOK_PORT = int(os.getenv("JIRA_WEBHOOK_PORT", "0"))
+JIRA_WEBHOOK_HOST = os.getenv("JIRA_WEBHOOK_HOST", "0.0.0.0")
+JIRA_WEBHOOK_PATH = os.getenv("JIRA_WEBHOOK_PATH", "/jira/webhook")
+JIRA_WEBHOOK_SECRET = os.getenv("JIRA_WEBHOOK_SECRET", "")
+JIRA_INDEX_RECONCILE = float(os.getenv("JIRA_INDEX_RECONCILE", "600"))
+JIRA_INDEX_RELEASES = int(os.getenv("JIRA_INDEX_RELEASES", "20"))
+
+# Получение обновлений Telegram: polling или webhook (для работы за балансировщиком)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+TELEGRAM_WEBHOOK_HOST = os.getenv("TELEGRAM_WEBHOOK_HOST", "0.0.0.0")
+TELEGRAM_WEBHOOK_PORT = int(os.getenv("TELEGRAM_WEBHOOK_PORT", "8080"))
+# Сколько обновлений обрабатывается одновременно и сколько ждать их завершения при остановке (сек)
+TELEGRAM_MAX_UPDATES = int(os.getenv("TELEGRAM_MAX_UPDATES", "100"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+
+# Хранилище подписок и аренд задач: sqlite (по умолчанию) или redis для нескольких экземпляров бота
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+STATE_DB = os.getenv("STATE_DB", "bot_state.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Как часто (сек) перечитывать подписки, принятые другими экземплярами
+STATE_SYNC_INTERVAL = float(os.getenv("STATE_SYNC_INTERVAL", "60"))
+INSTANCE_ID = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Ограничения Telegram на отправку: сообщений в секунду всего и в один чат
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+# Как часто (сек) обновлять сообщение, пока список релизов или отчёт ещё загружается
+PROGRESS_EDIT_INTERVAL = float(os.getenv("PROGRESS_EDIT_INTERVAL", "1"))
+
+# Поля, достаточные для сводок по релизам (без тяжёлых комментариев)
+SUMMARY_FIELDS = ["status", "customfield_11087", "updated", "fixVersions"]
+# Поля для детального отчёта по релизу
+DETAIL_FIELDS = ["key", "summary", "status", "customfield_11087", "updated", "comment"]
+# Поля задач в индексе релизов: достаточно для любого экрана
+INDEX_FIELDS = DETAIL_FIELDS + ["fixVersions"]
+
 # Проверка обязательных переменных
 required_vars = {
     "JIRA_URL": JIRA_URL,
@@ -48,11 +140,79 @@ if missing:
 API_URL = f"{JIRA_URL.rstrip('/')}/rest/api/3"
 JIRA_AUTH = aiohttp.BasicAuth(JIRA_EMAIL, JIRA_API_TOKEN)
 
-# Хранилище данных пользователей
+# Общий HTTP-клиент: по одному пулу keep-alive соединений на Jira и GitLab
+http_client = UpstreamClient({
+    "jira": UpstreamSettings(
+        pool_limit=HTTP_POOL_LIMIT,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        dns_ttl=HTTP_DNS_TTL,
+        timeout=JIRA_TIMEOUT,
+        headers={"Accept": "application/json"},
+        auth=JIRA_AUTH,
+        retries=UPSTREAM_RETRIES,
+        backoff_base=UPSTREAM_BACKOFF_BASE,
+        backoff_max=UPSTREAM_BACKOFF_MAX,
+        breaker_threshold=UPSTREAM_BREAKER_THRESHOLD,
+        breaker_reset=UPSTREAM_BREAKER_RESET,
+    ),
+    "gitlab": UpstreamSettings(
+        pool_limit=HTTP_POOL_LIMIT,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        dns_ttl=HTTP_DNS_TTL,
+        timeout=GITLAB_TIMEOUT,
+        headers={"PRIVATE-TOKEN": GITLAB_PRIVATE_TOKEN},
+        retries=UPSTREAM_RETRIES,
+        backoff_base=UPSTREAM_BACKOFF_BASE,
+        backoff_max=UPSTREAM_BACKOFF_MAX,
+        breaker_threshold=UPSTREAM_BREAKER_THRESHOLD,
+        breaker_reset=UPSTREAM_BREAKER_RESET,
+    ),
+})
+
+# Кэш результатов поиска Jira: ключ — (релиз, набор полей)
+issue_cache = TTLCache(maxsize=JIRA_CACHE_SIZE, ttl=JIRA_CACHE_TTL)
+
+# Кэш метаданных MR: слитые/закрытые хранятся долго, открытые — недолго
+mr_cache = MergeRequestCache(
+    open_ttl=GITLAB_MR_CACHE_TTL_OPEN,
+    final_ttl=GITLAB_MR_CACHE_TTL_FINAL,
+    db_path=GITLAB_MR_CACHE_DB or None,
+)
+
+# Индекс релизов из вебхуков Jira; без вебхуков он не заполняется и не используется
+release_index = ReleaseIndex(max_age=2 * JIRA_INDEX_RECONCILE)
+
+# Объединение одинаковых одновременных запросов к Jira и GitLab
+upstream_flight = SingleFlight()
+
+# Правила сервисов, скомпилированные один раз при запуске
+service_matcher = ServiceMatcher(SERVICE_PATTERNS)
+
+# Хранилище данных пользователей (копия состояния из state_backend)
 user_data: Dict[int, Dict[str, Any]] = {}
 
+
+def create_state_backend() -> StateBackend:
+    """Создаёт хранилище состояния по STATE_BACKEND; redis — необязательная зависимость."""
+    if STATE_BACKEND == "redis":
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise ValueError("Для STATE_BACKEND=redis установите пакет redis")
+        return RedisStateBackend(redis_asyncio.from_url(REDIS_URL, decode_responses=True))
+    return SQLiteStateBackend(STATE_DB)
+
+
+state_backend = create_state_backend()
+
+# Последние снимки релизов автоотчёта по интервалам — для отправки только изменений
+auto_report_snapshots: Dict[int, Dict[str, ReleaseSnapshot]] = {}
+
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
+# Все сообщения и правки сообщений уходят через общую очередь с ограничением скорости
+sender = MessageSender(bot, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE,
+                       chat_burst=TELEGRAM_CHAT_BURST)
 scheduler = AsyncIOScheduler()
 
 
@@ -69,50 +229,403 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
     return keyboard
 
 
-async def fetch_jira_issues(release_name: str) -> List[Dict]:
-    """Асинхронно получает задачи Jira для указанного релиза."""
+class JiraSearchError(Exception):
+    """Jira вернула неуспешный ответ на поиск задач."""
+
+
+JIRA_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, JiraSearchError, UpstreamError)
+
+
+def jql_quote(value: str) -> str:
+    """Экранирует строку для подстановки в JQL."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+async def iter_jira_issue_pages(jql: str, fields: List[str]) -> AsyncIterator[List[Dict]]:
+    """Постранично отдаёт задачи поиска Jira, следуя nextPageToken/isLast.
+
+    Следующая страница запрашивается сразу после получения текущей,
+    поэтому обработка страницы идёт параллельно с загрузкой следующей.
+    """
     url = f"{API_URL}/search/jql"
-    headers = {"Accept": "application/json", "Content-Type": "application/json"}
-    payload = {
-        "jql": f'fixVersion = "{release_name}"',
-        "maxResults": 100,
-        "fields": ["key", "summary", "status", "customfield_11087", "comment"]
-    }
-
-    async with aiohttp.ClientSession() as session:
+
+    async def fetch_page(page_token: Optional[str]) -> Dict:
+        payload: Dict[str, Any] = {"jql": jql, "maxResults": JIRA_PAGE_SIZE, "fields": fields}
+        if page_token:
+            payload["nextPageToken"] = page_token
+        # Поиск только читает данные, поэтому POST можно безопасно повторять
+        return await http_client.request_json("jira", "POST", url, json=payload, idempotent=True)
+
+    pending: Optional[asyncio.Future] = asyncio.ensure_future(fetch_page(None))
+    try:
+        while pending is not None:
+            data = await pending
+            pending = None
+            next_token = data.get("nextPageToken")
+            if next_token and not data.get("isLast", False):
+                pending = asyncio.ensure_future(fetch_page(next_token))
+            yield data.get("issues", [])
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def parse_issue(raw: Dict) -> Issue:
+    """Разбирает JSON задачи Jira в компактную модель; сырые комментарии не сохраняются."""
+    fields = raw.get("fields") or {}
+    status = (fields.get("status") or {}).get("name") or "Неизвестно"
+    rework_raw = fields.get("customfield_11087")
+    return Issue(
+        key=raw["key"],
+        summary=fields.get("summary"),
+        status=status,
+        is_review=is_review_status(status),
+        is_deploy=status == "Deploy",
+        rework=parse_rework(rework_raw),
+        rework_text="None" if rework_raw is None else str(rework_raw),
+        updated=fields.get("updated"),
+        fix_versions=tuple(v.get("name") for v in fields.get("fixVersions") or []),
+        service_plan=plan_issue_services(raw) if "comment" in fields else [],
+        services=[],
+    )
+
+
+async def iter_parsed_issue_pages(jql: str, fields: List[str]) -> AsyncIterator[List[Issue]]:
+    """Постранично отдаёт задачи поиска Jira, уже разобранные в модель Issue."""
+    async for page in iter_jira_issue_pages(jql, fields):
+        yield [parse_issue(raw) for raw in page]
+
+
+async def collect_jira_issues(jql: str, fields: List[str]) -> List[Issue]:
+    """Собирает задачи со всех страниц поиска; ошибки Jira пробрасываются вызывающему.
+
+    Одинаковые одновременные поиски выполняются в Jira один раз.
+    """
+    async def collect() -> List[Issue]:
+        issues: List[Issue] = []
+        async for page in iter_parsed_issue_pages(jql, fields):
+            issues.extend(page)
+        return issues
+
+    return list(await upstream_flight.do(("jira", jql, tuple(fields)), collect))
+
+
+async def search_jira_issues(jql: str, fields: List[str]) -> List[Issue]:
+    """Выполняет поиск в Jira и собирает задачи со всех страниц."""
+    try:
+        return await collect_jira_issues(jql, fields)
+    except JIRA_ERRORS:
+        return []
+
+
+def merge_issues(cached: List[Issue], changed: List[Issue]) -> List[Issue]:
+    """Заменяет в закэшированном списке изменившиеся задачи и добавляет новые."""
+    changed_by_key = {issue.key: issue for issue in changed}
+    merged = [changed_by_key.pop(issue.key, issue) for issue in cached]
+    merged.extend(changed_by_key.values())
+    return merged
+
+
+def group_issues_by_release(issues: List[Issue], release_names: List[str]) -> Dict[str, List[Issue]]:
+    """Раскладывает задачи по релизам из поля fixVersions."""
+    grouped: Dict[str, List[Issue]] = {name: [] for name in release_names}
+    for issue in issues:
+        for name in issue.fix_versions:
+            if name in grouped:
+                grouped[name].append(issue)
+    return grouped
+
+
+def updated_since_jql(entry: CacheEntry) -> str:
+    """Условие JQL на задачи, изменившиеся после последнего обновления записи кэша.
+
+    Используется относительное время Jira, чтобы не зависеть от часового пояса
+    пользователя API; минута запаса покрывает округление.
+    """
+    minutes = int((issue_cache.now() - entry.refreshed_at) // 60) + 2
+    return f"updated >= -{minutes}m"
+
+
+def can_refresh_incrementally(entry: Optional[CacheEntry]) -> bool:
+    """Устаревшую запись можно дообновить, пока не пришло время полной перезагрузки."""
+    return entry is not None and issue_cache.now() - entry.loaded_at < JIRA_CACHE_FULL_RELOAD
+
+
+async def iter_release_issue_pages(release_name: str, fields: List[str]) -> AsyncIterator[List[Issue]]:
+    """Постранично отдаёт задачи релиза, используя кэш поиска.
+
+    Свежая запись отдаётся из кэша, устаревшая дообновляется запросом
+    updated >= ..., иначе релиз загружается из Jira целиком. Если Jira
+    недоступна, отдаются последние закэшированные данные. Релизы из индекса
+    вебхуков отдаются без запросов к Jira.
+    """
+    indexed = release_index.get(release_name)
+    if indexed is not None:
+        yield indexed
+        return
+
+    key = (release_name, tuple(fields))
+    release_jql = f"fixVersion = {jql_quote(release_name)}"
+    entry = issue_cache.get(key)
+
+    if entry is not None and issue_cache.is_fresh(entry):
+        yield entry.value
+        return
+
+    if can_refresh_incrementally(entry):
         try:
-            async with session.post(url, json=payload, headers=headers, auth=JIRA_AUTH, timeout=10) as resp:
-                if resp.status != 200:
-                    return []
-                data = await resp.json()
-                return data.get("issues", [])
-        except (aiohttp.ClientError, asyncio.TimeoutError):
-            return []
+            changed = await collect_jira_issues(f"{release_jql} AND {updated_since_jql(entry)}", fields)
+        except JIRA_ERRORS:
+            yield entry.value
+            return
+        entry = issue_cache.set(key, merge_issues(entry.value, changed), loaded_at=entry.loaded_at)
+        yield entry.value
+        return
 
+    # Если этот релиз уже загружается другим обработчиком, ждём его результат
+    flight_key = ("jira", release_jql, tuple(fields))
+    shared = upstream_flight.pending(flight_key)
+    if shared is not None:
+        try:
+            yield list(await asyncio.shield(shared))
+        except JIRA_ERRORS:
+            if entry is None:
+                raise
+            yield entry.value
+        return
 
-async def check_mr_target_branch(mr_url: str) -> bool:
-    """Проверяет, ведёт ли MR в целевую ветку (TARGET_BRANCH)."""
-    headers = {"PRIVATE-TOKEN": GITLAB_PRIVATE_TOKEN}
-    pattern = r'https://gitlab\.com/(.+?)/-/merge_requests/(\d+)'
-    match = re.search(pattern, mr_url)
+    issues: List[Issue] = []
+    completed = False
+    future = upstream_flight.start(flight_key)
+    try:
+        async for page in iter_parsed_issue_pages(release_jql, fields):
+            issues.extend(page)
+            yield page
+        completed = True
+    except JIRA_ERRORS as e:
+        upstream_flight.finish(flight_key, future, error=e)
+        if entry is not None and not issues:
+            yield entry.value
+            return
+        raise
+    finally:
+        if completed:
+            issue_cache.set(key, issues)
+            upstream_flight.finish(flight_key, future, issues)
+        else:
+            # Загрузка прервана вызывающим (например, генератор закрыт досрочно)
+            upstream_flight.finish(flight_key, future, error=JiraSearchError("Release load was interrupted"))
+
+
+async def fetch_jira_issues(release_name: str) -> List[Issue]:
+    """Асинхронно получает задачи Jira для указанного релиза."""
+    issues: List[Issue] = []
+    try:
+        async for page in iter_release_issue_pages(release_name, DETAIL_FIELDS):
+            issues.extend(page)
+    except JIRA_ERRORS:
+        return []
+    return issues
+
+
+async def fetch_issues_for_releases(release_names: List[str],
+                                    fields: Optional[List[str]] = None) -> List[List[Issue]]:
+    """Получает задачи сразу нескольких релизов одним запросом fixVersion in (...) на группу.
+
+    Задачи раскладываются по релизам по полю fixVersions, порядок релизов сохраняется.
+    Релизы из индекса вебхуков и свежие релизы берутся из памяти, устаревшие
+    дообновляются одним запросом по изменившимся задачам.
+    """
+    fields = list(fields or SUMMARY_FIELDS)
+    if "fixVersions" not in fields:
+        fields.append("fixVersions")
+    fields_key = tuple(fields)
+
+    results: Dict[str, List[Issue]] = {}
+    stale: Dict[str, CacheEntry] = {}
+    to_load: List[str] = []
+    for name in release_names:
+        indexed = release_index.get(name)
+        if indexed is not None:
+            results[name] = indexed
+            continue
+        entry = issue_cache.get((name, fields_key))
+        if entry is not None and issue_cache.is_fresh(entry):
+            results[name] = entry.value
+        elif can_refresh_incrementally(entry):
+            stale[name] = entry
+        else:
+            if entry is not None:
+                stale[name] = entry
+            to_load.append(name)
+
+    semaphore = asyncio.Semaphore(JIRA_CONCURRENCY)
+
+    def chunked(names: List[str]) -> List[List[str]]:
+        return [names[i:i + JIRA_BULK_RELEASES] for i in range(0, len(names), JIRA_BULK_RELEASES)]
+
+    async def load_chunk(chunk: List[str]):
+        jql = f"fixVersion in ({', '.join(jql_quote(name) for name in chunk)})"
+        async with semaphore:
+            issues = await collect_jira_issues(jql, fields)
+        for name, release_issues in group_issues_by_release(issues, chunk).items():
+            results[name] = release_issues
+            issue_cache.set((name, fields_key), release_issues)
+
+    async def refresh_chunk(chunk: List[str]):
+        since = updated_since_jql(min((stale[name] for name in chunk), key=lambda e: e.refreshed_at))
+        jql = f"fixVersion in ({', '.join(jql_quote(name) for name in chunk)}) AND {since}"
+        async with semaphore:
+            changed = await collect_jira_issues(jql, fields)
+        for name, release_changed in group_issues_by_release(changed, chunk).items():
+            entry = stale[name]
+            results[name] = merge_issues(entry.value, release_changed)
+            issue_cache.set((name, fields_key), results[name], loaded_at=entry.loaded_at)
+
+    to_refresh = [name for name in release_names if name in stale and name not in to_load]
+    await asyncio.gather(
+        *(load_chunk(chunk) for chunk in chunked(to_load)),
+        *(refresh_chunk(chunk) for chunk in chunked(to_refresh)),
+        return_exceptions=True,
+    )
+
+    # Если Jira не ответила, показываем последние известные данные
+    return [results.get(name, stale[name].value if name in stale else []) for name in release_names]
+
+
+async def load_review_statuses() -> List[str]:
+    url = f"{API_URL}/project/{PROJECT_KEY}/statuses"
+    issue_types = await http_client.request_json("jira", "GET", url)
+    names = {status.get("name", "") for issue_type in issue_types for status in issue_type.get("statuses", [])}
+    return sorted(name for name in names if is_review_status(name))
+
+
+async def fetch_review_statuses() -> List[str]:
+    """Названия статусов проекта, которые считаются ревью (кэшируются надолго)."""
+    key = ("review_statuses", PROJECT_KEY)
+    entry = issue_cache.get(key)
+    if entry is not None and issue_cache.now() - entry.refreshed_at < JIRA_STATUSES_TTL:
+        return entry.value
+    statuses = await upstream_flight.do(key, load_review_statuses)
+    issue_cache.set(key, statuses)
+    return statuses
+
+
+async def load_issue_count(jql: str) -> int:
+    url = f"{API_URL}/search/approximate-count"
+    data = await http_client.request_json("jira", "POST", url, json={"jql": jql}, idempotent=True)
+    return int(data.get("count", 0))
+
+
+async def count_jira_issues(jql: str) -> int:
+    """Число задач по JQL без загрузки самих задач.
+
+    Если Jira недоступна, отдаётся последнее известное число, иначе ошибка пробрасывается.
+    """
+    key = ("count", jql)
+    entry = issue_cache.get(key)
+    if entry is not None and issue_cache.is_fresh(entry):
+        return entry.value
+    try:
+        count = await upstream_flight.do(key, lambda: load_issue_count(jql))
+    except JIRA_ERRORS:
+        if entry is None:
+            raise
+        return entry.value
+    issue_cache.set(key, count)
+    return count
+
+
+async def fetch_release_counts(release_names: List[str],
+                               on_total: Optional[Callable[[int, int], Awaitable[Any]]] = None
+                               ) -> List[ReleaseSummary]:
+    """Число задач и задач в ревью по релизам для выбора релиза.
+
+    Общее число берётся count-запросами, задачи в ревью — одним поиском только
+    по статусам ревью и только с полем fixVersions. Если count-запросы
+    недоступны, используется обычная пакетная загрузка сводок.
+    on_total(индекс релиза, число задач) вызывается по мере ответов Jira.
+    """
+    indexed = [release_index.get(name) for name in release_names]
+    if all(issues is not None for issues in indexed):
+        return [summarize_issues(issues) for issues in indexed]
+
+    semaphore = asyncio.Semaphore(JIRA_CONCURRENCY)
 
+    async def count_release(index: int) -> Tuple[int, int]:
+        async with semaphore:
+            return index, await count_jira_issues(f"fixVersion = {jql_quote(release_names[index])}")
+
+    totals = [0] * len(release_names)
+    tasks = [asyncio.ensure_future(count_release(index)) for index in range(len(release_names))]
+    try:
+        for next_total in asyncio.as_completed(tasks):
+            index, total = await next_total
+            totals[index] = total
+            if on_total is not None:
+                await on_total(index, total)
+        review_statuses = await fetch_review_statuses()
+        review_by_release: Dict[str, List[Issue]] = {name: [] for name in release_names}
+        if review_statuses and any(totals):
+            names = [name for name, total in zip(release_names, totals) if total]
+            jql = (f"fixVersion in ({', '.join(jql_quote(name) for name in names)}) "
+                   f"AND status in ({', '.join(jql_quote(status) for status in review_statuses)})")
+            review_by_release.update(group_issues_by_release(await collect_jira_issues(jql, ["fixVersions"]), names))
+    except JIRA_ERRORS:
+        return [summarize_issues(issues) for issues in await fetch_issues_for_releases(release_names)]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return [ReleaseSummary(total=total, review=len(review_by_release[name]))
+            for name, total in zip(release_names, totals)]
+
+
+MR_URL_PATTERN = re.compile(r'https://gitlab\.com/(.+?)/-/merge_requests/(\d+)')
+
+
+def parse_mr_url(mr_url: str) -> Optional[Tuple[str, str]]:
+    """Достаёт путь проекта и iid из ссылки на merge request."""
+    match = MR_URL_PATTERN.search(mr_url)
     if not match:
-        return False
+        return None
+    return match.group(1), match.group(2)
+
+
+async def fetch_merge_request(project_path: str, mr_id: str) -> Optional[MergeRequestInfo]:
+    """Получает целевую ветку и состояние MR, используя кэш метаданных."""
+    info = mr_cache.get(project_path, mr_id)
+    if info is not None:
+        return info
+
+    info = await upstream_flight.do(("mr", project_path, str(mr_id)),
+                                    lambda: load_merge_request(project_path, mr_id))
+    # Если GitLab недоступен, используем устаревшие метаданные
+    return info if info is not None else mr_cache.get(project_path, mr_id, allow_expired=True)
 
-    project_path = match.group(1)
-    mr_id = match.group(2)
+
+async def load_merge_request(project_path: str, mr_id: str) -> Optional[MergeRequestInfo]:
     encoded_project = urllib.parse.quote_plus(project_path)
-    api_url = f"https://gitlab.com/api/v4/projects/{encoded_project}/merge_requests/{mr_id}"
+    api_url = f"{GITLAB_API_URL}/projects/{encoded_project}/merge_requests/{mr_id}"
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(api_url, headers=headers, timeout=10) as resp:
-                if resp.status != 200:
-                    return False
-                data = await resp.json()
-                return data.get("target_branch") == TARGET_BRANCH
-        except (aiohttp.ClientError, asyncio.TimeoutError):
-            return False
+    try:
+        data = await http_client.request_json("gitlab", "GET", api_url)
+    except (aiohttp.ClientError, asyncio.TimeoutError, UpstreamError):
+        return None
+
+    info = MergeRequestInfo(target_branch=data.get("target_branch"), state=data.get("state", "opened"))
+    mr_cache.set(project_path, mr_id, info)
+    return info
+
+
+async def check_mr_target_branch(mr_url: str) -> bool:
+    """Проверяет, ведёт ли MR в целевую ветку (TARGET_BRANCH)."""
+    parsed = parse_mr_url(mr_url)
+    if not parsed:
+        return False
+
+    info = await fetch_merge_request(*parsed)
+    return info is not None and info.target_branch == TARGET_BRANCH
 
 
 def extract_text_from_comment(comment_body: Any) -> str:
@@ -133,135 +646,235 @@ def extract_text_from_comment(comment_body: Any) -> str:
     return ' '.join(text_parts)
 
 
-async def get_services_from_issue(issue: Dict) -> List[str]:
-    """Анализирует комментарии задачи и возвращает список сервисов для деплоя."""
-    services = []
+def get_service_matcher() -> ServiceMatcher:
+    """Возвращает скомпилированный матчер правил, пересобирая его при замене SERVICE_PATTERNS."""
+    global service_matcher
+    if service_matcher.rules is not SERVICE_PATTERNS:
+        service_matcher = ServiceMatcher(SERVICE_PATTERNS)
+    return service_matcher
+
+
+def plan_issue_services(issue: Dict) -> List[Tuple]:
+    """Первый этап анализа: находит в комментариях сервисы и ссылки на MR без запросов к GitLab.
+
+    Возвращает упорядоченный список ("service", имя) и ("mr", правило, ссылка).
+    """
+    plan: List[Tuple] = []
     comments = issue.get("fields", {}).get("comment", {}).get("comments", [])
+    matcher = get_service_matcher()
 
     for comment in comments:
         body = comment.get('body', '')
         text = extract_text_from_comment(body).lower()
 
-        for rule in SERVICE_PATTERNS:
-            pattern = rule["pattern"].lower()
-            if pattern not in text:
-                continue
-
+        urls = None
+        for index in matcher.match(text):
+            rule = matcher.rules[index]
             if rule.get("branch_based"):
-                urls = re.findall(r'(https?://[^\s]+)', text)
-                for url in urls:
-                    if pattern in url:
-                        is_target = await check_mr_target_branch(url)
-                        if is_target:
-                            service_name = rule["branch_map"].get(TARGET_BRANCH, rule.get("default_service", "Unknown"))
-                        else:
-                            service_name = rule.get("default_service", "Unknown")
-                        if service_name not in services:
-                            services.append(service_name)
+                if urls is None:
+                    urls = matcher.extract_urls(text)
+                pattern = matcher.patterns[index]
+                plan.extend(("mr", rule, url) for url in urls if pattern in url)
             else:
-                service_name = rule["service"]
-                if service_name not in services:
-                    services.append(service_name)
+                plan.append(("service", rule["service"]))
+
+    return plan
+
+
+async def fetch_project_merge_requests(project_path: str, iids: List[str]) -> Dict[str, MergeRequestInfo]:
+    """Получает несколько MR одного проекта запросом с iids[] и складывает их в кэш."""
+    return await upstream_flight.do(("mr", project_path, tuple(iids)),
+                                    lambda: load_project_merge_requests(project_path, iids))
+
+
+async def load_project_merge_requests(project_path: str, iids: List[str]) -> Dict[str, MergeRequestInfo]:
+    encoded_project = urllib.parse.quote_plus(project_path)
+    api_url = f"{GITLAB_API_URL}/projects/{encoded_project}/merge_requests"
+    found: Dict[str, MergeRequestInfo] = {}
+
+    for i in range(0, len(iids), GITLAB_IIDS_PER_REQUEST):
+        chunk = iids[i:i + GITLAB_IIDS_PER_REQUEST]
+        params = [("iids[]", iid) for iid in chunk] + [("per_page", str(GITLAB_IIDS_PER_REQUEST))]
+        try:
+            data = await http_client.request_json("gitlab", "GET", api_url, params=params)
+        except (aiohttp.ClientError, asyncio.TimeoutError, UpstreamError):
+            continue
+
+        for item in data:
+            iid = str(item.get("iid"))
+            info = MergeRequestInfo(target_branch=item.get("target_branch"), state=item.get("state", "opened"))
+            mr_cache.set(project_path, iid, info)
+            found[iid] = info
+
+    return found
+
+
+async def resolve_merge_requests(mr_urls: List[str]) -> Dict[str, Optional[MergeRequestInfo]]:
+    """Второй этап анализа: разрешает все ссылки на MR пачками по проектам.
+
+    Закэшированные MR не запрашиваются, остальные группируются по проекту,
+    проекты обрабатываются параллельно с ограничением GITLAB_CONCURRENCY.
+    """
+    refs = {url: parse_mr_url(url) for url in mr_urls}
+    resolved: Dict[Tuple[str, str], Optional[MergeRequestInfo]] = {}
+    missing: Dict[str, List[str]] = {}
+
+    for ref in set(ref for ref in refs.values() if ref is not None):
+        info = mr_cache.get(*ref)
+        if info is not None:
+            resolved[ref] = info
+        else:
+            missing.setdefault(ref[0], []).append(ref[1])
+
+    semaphore = asyncio.Semaphore(GITLAB_CONCURRENCY)
 
+    async def fetch_project(project_path: str, iids: List[str]):
+        async with semaphore:
+            found = await fetch_project_merge_requests(project_path, sorted(iids, key=int))
+        for iid in iids:
+            # Если GitLab недоступен, используем устаревшие метаданные
+            resolved[(project_path, iid)] = found.get(iid) or mr_cache.get(project_path, iid, allow_expired=True)
+
+    await asyncio.gather(*(fetch_project(project, iids) for project, iids in missing.items()),
+                         return_exceptions=True)
+
+    return {url: resolved.get(ref) if ref else None for url, ref in refs.items()}
+
+
+def assign_services(plan: List[Tuple], merge_requests: Dict[str, Optional[MergeRequestInfo]]) -> List[str]:
+    """Третий этап анализа: превращает план задачи в список сервисов по данным MR."""
+    services = []
+    for entry in plan:
+        if entry[0] == "mr":
+            _, rule, url = entry
+            info = merge_requests.get(url)
+            if info is not None and info.target_branch == TARGET_BRANCH:
+                service_name = rule["branch_map"].get(TARGET_BRANCH, rule.get("default_service", "Unknown"))
+            else:
+                service_name = rule.get("default_service", "Unknown")
+        else:
+            service_name = entry[1]
+        if service_name not in services:
+            services.append(service_name)
     return services
 
 
-async def show_release_details(chat_id: int, release_name: str, show_review_only: bool = False):
-    """Отображает детальную информацию о релизе в Telegram."""
-    issues = await fetch_jira_issues(release_name)
+async def get_services_for_plans(plans: List[List[Tuple]]) -> List[List[str]]:
+    """Разрешает ссылки на MR из всех планов разом и возвращает сервисы каждой задачи."""
+    mr_urls = list(dict.fromkeys(entry[2] for plan in plans for entry in plan if entry[0] == "mr"))
+    merge_requests = await resolve_merge_requests(mr_urls) if mr_urls else {}
+    return [assign_services(plan, merge_requests) for plan in plans]
 
-    if not issues:
-        await bot.send_message(chat_id, f"❌ В релизе '{release_name}' нет задач")
-        return
 
-    if show_review_only:
-        review_issues = []
-        for issue in issues:
-            status = issue.get("fields", {}).get("status", {}).get("name", "").lower()
-            if "review" in status or "ревью" in status:
-                review_issues.append(issue)
-
-        if not review_issues:
-            await bot.send_message(chat_id, f"📭 В релизе '{release_name}' нет задач в статусе Review")
-            return
+async def get_services_from_issue(issue: Dict) -> List[str]:
+    """Анализирует комментарии задачи и возвращает список сервисов для деплоя."""
+    return (await get_services_for_plans([plan_issue_services(issue)]))[0]
 
-        issues = review_issues
-        title_suffix = " (ТОЛЬКО задачи в Review)"
-    else:
-        title_suffix = ""
 
-    # Группировка по сервисам
-    result: Dict[str, List[Dict]] = {}
-    issue_service_map: Dict[str, str] = {}
+async def resolve_issue_services(issues: List[Issue]):
+    """Определяет сервисы задач, разрешая ссылки на MR всех задач одним пакетом."""
+    services_by_issue = await get_services_for_plans([issue.service_plan for issue in issues])
+    for issue, services in zip(issues, services_by_issue):
+        issue.services = services
+
+
+def render_release_report(release_name: str, issues: List[Issue], show_review_only: bool,
+                          incomplete: bool = False) -> str:
+    """Собирает текст отчёта по релизу за один проход по задачам."""
+    by_service: Dict[str, List[str]] = {}
+    high_rework: List[str] = []
+    deploy_tasks: List[str] = []
 
     for issue in issues:
-        services = await get_services_from_issue(issue)
-        for service in services:
-            if service not in result:
-                result[service] = []
-            workratio = issue.get("fields", {}).get('customfield_11087')
-            workratio_str = "None" if workratio is None else str(workratio)
-            result[service].append({
-                'key': issue["key"],
-                'name': issue["fields"]['summary'],
-                'workratio': workratio_str,
-                'status': issue.get("fields", {}).get("status", {}).get("name", "Неизвестно")
-            })
-            issue_service_map[issue["key"]] = service
+        status_icon = "👁‍🗨" if issue.is_review else "📋"
+        line = f"{status_icon} {issue.key} - {issue.summary} - Попыток QA: {issue.rework_text}"
+        for service in issue.services:
+            by_service.setdefault(service, []).append(line)
+        if issue.has_high_rework:
+            high_rework.append(f"⚠️ {issue.key} - {issue.summary} - Попыток QA: {issue.rework_text}")
+        if issue.is_deploy and issue.services:
+            deploy_tasks.append(f"{issue.key} перевести в деплой сервис {issue.services[-1]}")
 
     report_lines = []
-    for service, issues_list in result.items():
+    for service, lines in by_service.items():
         report_lines.append(f"{service}")
-        for issue_data in issues_list:
-            status_icon = "👁‍🗨" if "review" in issue_data['status'].lower() or "ревью" in issue_data['status'].lower() else "📋"
-            report_lines.append(
-                f"{status_icon} {issue_data['key']} - {issue_data['name']} - Попыток QA: {issue_data['workratio']}"
-            )
+        report_lines.extend(lines)
         report_lines.append("")
 
     if not show_review_only:
         report_lines.append("БОЛЬШОЕ КОЛИЧЕСТВО РЕВОРКОВ")
-        for issue in issues:
-            try:
-                workratio = issue.get("fields", {}).get('customfield_11087', 0)
-                if workratio and float(workratio) > 3:
-                    report_lines.append(
-                        f"⚠️ {issue['key']} - {issue['fields']['summary']} - Попыток QA: {workratio}"
-                    )
-            except (ValueError, TypeError):
-                continue
+        report_lines.extend(high_rework)
 
         report_lines.append("")
         report_lines.append("─" * 40)
         report_lines.append("")
 
-        deploy_tasks = []
-        for issue in issues:
-            if issue.get("fields", {}).get("status", {}).get("name") == 'Deploy':
-                if issue['key'] in issue_service_map:
-                    deploy_tasks.append(f"{issue['key']} перевести в деплой сервис {issue_service_map[issue['key']]}")
-
         if deploy_tasks:
             report_lines.extend(deploy_tasks)
             report_lines.append("")
 
-    full_report = f"📊 Релиз: {release_name}{title_suffix}\nНайдено задач: {len(issues)}\n\n" + "\n".join(report_lines)
+    if incomplete:
+        report_lines.append("⚠️ Не все задачи релиза удалось загрузить из Jira, отчёт может быть неполным")
 
-    # Разбивка на части
+    title_suffix = " (ТОЛЬКО задачи в Review)" if show_review_only else ""
+    return f"📊 Релиз: {release_name}{title_suffix}\nНайдено задач: {len(issues)}\n\n" + "\n".join(report_lines)
+
+
+def split_message(text: str, limit: int = 4000) -> List[str]:
+    """Разбивает длинный текст на части не длиннее limit по границам строк."""
     message_parts = []
     current_part = ""
-    for line in full_report.split('\n'):
-        if len(current_part) + len(line) + 1 > 4000:
+    for line in text.split('\n'):
+        if len(current_part) + len(line) + 1 > limit:
             message_parts.append(current_part)
             current_part = line + '\n'
         else:
             current_part += line + '\n'
     if current_part:
         message_parts.append(current_part)
+    return message_parts
+
+
+def format_report_parts(report: str) -> List[str]:
+    """Части отчёта в виде блоков моноширинного текста Markdown."""
+    return [f"```\n{part}\n```" for part in split_message(report)]
+
+
+async def show_release_details(chat_id: int, release_name: str, show_review_only: bool = False):
+    """Отображает детальную информацию о релизе в Telegram.
+
+    Задачи загружаются постранично и сразу разбираются в компактную модель.
+    Ссылки на MR каждой страницы разрешаются в GitLab одним пакетом, и отчёт
+    отправляется сразу после первой страницы, а затем дописывается.
+    """
+    issues: List[Issue] = []
+    total_count = 0
+    incomplete = False
+    report = LiveMessage(sender, chat_id, interval=PROGRESS_EDIT_INTERVAL)
+
+    try:
+        async for page in iter_release_issue_pages(release_name, DETAIL_FIELDS):
+            total_count += len(page)
+            page_issues = [issue for issue in page if issue.is_review or not show_review_only]
+            if not page_issues:
+                continue
+            await resolve_issue_services(page_issues)
+            issues.extend(page_issues)
+            await report.update(format_report_parts(render_release_report(release_name, issues, show_review_only)),
+                                parse_mode='Markdown')
+    except JIRA_ERRORS:
+        incomplete = True
+
+    if not total_count:
+        await sender.send_message(chat_id, f"❌ В релизе '{release_name}' нет задач")
+        return
+
+    if show_review_only and not issues:
+        await sender.send_message(chat_id, f"📭 В релизе '{release_name}' нет задач в статусе Review")
+        return
 
-    for part in message_parts:
-        await bot.send_message(chat_id, f"```\n{part}\n```", parse_mode='Markdown')
-        await asyncio.sleep(0.5)
+    full_report = render_release_report(release_name, issues, show_review_only, incomplete)
+    await report.finish(format_report_parts(full_report), parse_mode='Markdown')
 
     # Инлайн-кнопки
     keyboard = InlineKeyboardBuilder()
@@ -274,7 +887,7 @@ async def show_release_details(chat_id: int, release_name: str, show_review_only
     keyboard.button(text="← Назад к списку релизов", callback_data="back_to_list")
     keyboard.adjust(1)
 
-    await bot.send_message(chat_id, "Выберите действие:", reply_markup=keyboard.as_markup())
+    await sender.send_message(chat_id, "Выберите действие:", reply_markup=keyboard.as_markup())
 
 
 async def send_release_links(chat_id: int, release_name: str):
@@ -282,23 +895,19 @@ async def send_release_links(chat_id: int, release_name: str):
     issues = await fetch_jira_issues(release_name)
 
     if not issues:
-        await bot.send_message(chat_id, f"❌ В релизе '{release_name}' нет задач")
+        await sender.send_message(chat_id, f"❌ В релизе '{release_name}' нет задач")
         return
 
-    review_issues = []
-    for issue in issues:
-        status = issue.get("fields", {}).get("status", {}).get("name", "").lower()
-        if "review" in status or "ревью" in status:
-            review_issues.append(issue)
+    review_issues = [issue for issue in issues if issue.is_review]
 
     if not review_issues:
-        await bot.send_message(chat_id, f"📭 В релизе '{release_name}' нет задач в статусе Review")
+        await sender.send_message(chat_id, f"📭 В релизе '{release_name}' нет задач в статусе Review")
         return
 
     message = f"🔗 <b>Ссылки на задачи в статусе Review (Релиз: {release_name})</b>\n\n"
     for issue in review_issues:
-        issue_key = issue["key"]
-        summary = issue.get("fields", {}).get("summary", "Без названия")
+        issue_key = issue.key
+        summary = issue.summary or "Без названия"
         issue_url = f"{JIRA_URL}/browse/{issue_key}"
         message += f"• <a href='{issue_url}'>{issue_key}</a> - {summary}\n"
 
@@ -310,58 +919,101 @@ async def send_release_links(chat_id: int, release_name: str):
     keyboard.button(text="← Назад к списку релизов", callback_data="back_to_list")
     keyboard.adjust(1)
 
-    await bot.send_message(chat_id, message, parse_mode='HTML', disable_web_page_preview=True,
+    await sender.send_message(chat_id, message, parse_mode='HTML', disable_web_page_preview=True,
                            reply_markup=keyboard.as_markup())
 
 
-async def fetch_project_versions() -> List[Dict]:
-    """Получает список версий проекта из Jira."""
+async def load_project_versions() -> List[Dict]:
     url = f"{API_URL}/project/{PROJECT_KEY}/versions"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, auth=JIRA_AUTH, timeout=10) as resp:
-                if resp.status != 200:
-                    return []
-                return await resp.json()
-        except (aiohttp.ClientError, asyncio.TimeoutError):
-            return []
+    return await http_client.request_json("jira", "GET", url)
 
 
-async def send_releases_list(chat_id: int, from_auto_report: bool = False):
-    """Отправляет список доступных релизов с задачами."""
-    versions = await fetch_project_versions()
+async def fetch_project_versions() -> List[Dict]:
+    """Получает список версий проекта из Jira; если Jira недоступна — последний полученный."""
+    key = ("versions", PROJECT_KEY)
+    try:
+        versions = await upstream_flight.do(key, load_project_versions)
+    except JIRA_ERRORS:
+        entry = issue_cache.peek(key)
+        versions = entry.value if entry is not None else []
+    else:
+        issue_cache.set(key, versions)
+    # Вызывающие сортируют список на месте, поэтому каждому отдаётся своя копия
+    return list(versions)
 
-    if not versions:
-        await bot.send_message(chat_id, "❌ Ошибка при получении списка релизов")
-        return
 
+def get_releases_keyboard(release_names: List[str],
+                          summaries: Dict[int, ReleaseSummary]) -> Optional[types.InlineKeyboardMarkup]:
+    """Кнопки релизов с задачами в порядке версий проекта (по уже известным сводкам)."""
     keyboard = InlineKeyboardBuilder()
-    for version in versions[:20]:
-        release_name = version.get('name', 'Без названия')
-        issues = await fetch_jira_issues(release_name)
-        count = len(issues)
-        if count > 0:
-            review_count = sum(1 for i in issues if "review" in i.get("fields", {}).get("status", {}).get("name", "").lower())
-            button_text = f"{release_name} ({count} задач"
-            if review_count > 0:
-                button_text += f", {review_count} в ревью"
+    for index in sorted(summaries):
+        summary = summaries[index]
+        if summary.total > 0:
+            button_text = f"{release_names[index]} ({summary.total} задач"
+            if summary.review > 0:
+                button_text += f", {summary.review} в ревью"
             button_text += ")"
-            keyboard.button(text=button_text, callback_data=f"rel_{release_name}")
+            keyboard.button(text=button_text, callback_data=f"rel_{release_names[index]}")
 
     keyboard.adjust(1)
+    return keyboard.as_markup() if keyboard.buttons else None
+
+
+async def send_releases_list(chat_id: int, from_auto_report: bool = False,
+                             placeholder: Optional[types.Message] = None):
+    """Отправляет список доступных релизов с задачами.
 
-    if keyboard.buttons:
-        await bot.send_message(chat_id, "📋 Выберите релиз для просмотра задач:", reply_markup=keyboard.as_markup())
+    Сообщение-заглушка (переданное или новое) дополняется кнопками релизов
+    по мере ответов Jira, не дожидаясь самого медленного релиза.
+    """
+    picker = LiveMessage(sender, chat_id, interval=PROGRESS_EDIT_INTERVAL,
+                         messages=[placeholder] if placeholder is not None else None)
+    if placeholder is None:
+        await picker.update(["📋 Загружаю список релизов..."])
+
+    versions = await fetch_project_versions()
+
+    if not versions:
+        await picker.finish(["❌ Ошибка при получении списка релизов"])
+        return
+
+    release_names = [version.get('name', 'Без названия') for version in versions[:20]]
+    loaded: Dict[int, ReleaseSummary] = {}
+
+    async def on_total(index: int, total: int):
+        loaded[index] = ReleaseSummary(total=total)
+        await picker.update([f"📋 Выберите релиз для просмотра задач:\n⏳ Загружено релизов: {len(loaded)} из "
+                             f"{len(release_names)}"], reply_markup=get_releases_keyboard(release_names, loaded))
+
+    summaries = await fetch_release_counts(release_names, on_total=on_total)
+    reply_markup = get_releases_keyboard(release_names, dict(enumerate(summaries)))
+
+    if reply_markup is not None:
+        await picker.finish(["📋 Выберите релиз для просмотра задач:"], reply_markup=reply_markup)
     else:
-        await bot.send_message(chat_id, "❌ Во всех релизах пока нет задач")
+        await picker.finish(["❌ Во всех релизах пока нет задач"])
 
 
 # --- Обработчики команд ---
 
+async def save_user(user_id: int, user: Dict[str, Any]):
+    """Сохраняет пользователя в хранилище; при ошибке данные остаются только в памяти."""
+    try:
+        await state_backend.save_user(user_id, user)
+    except Exception as e:
+        print(f"⚠️ Ошибка сохранения пользователя {user_id}: {e}")
+
+
+async def remember_chat(user_id: int, chat_id: int):
+    user = user_data.setdefault(user_id, {})
+    if user.get('chat_id') != chat_id:
+        user['chat_id'] = chat_id
+        await save_user(user_id, user)
+
+
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
-    user_id = message.from_user.id
-    user_data[user_id] = {'chat_id': message.chat.id}
+    await remember_chat(message.from_user.id, message.chat.id)
     text = """
 🤖 Бот для проверки релизов Jira
 
@@ -372,27 +1024,27 @@ async def cmd_start(message: types.Message):
 
 <b>Используйте кнопки внизу для быстрого доступа к командам!</b>
     """
-    await message.answer(text, parse_mode='HTML', reply_markup=get_main_keyboard())
+    await sender.send_message(message.chat.id, text, parse_mode='HTML', reply_markup=get_main_keyboard())
 
 
 @dp.message(Command("check"))
 async def cmd_check(message: types.Message):
-    user_id = message.from_user.id
-    user_data[user_id] = {'chat_id': message.chat.id}
-    await message.answer("🔍 Загружаю список релизов...", reply_markup=get_main_keyboard())
-    await send_releases_list(message.chat.id)
+    await remember_chat(message.from_user.id, message.chat.id)
+    await sender.send_message(message.chat.id, "🔍 Загружаю список релизов...", reply_markup=get_main_keyboard())
+    with latency_budget(RELEASES_LIST_BUDGET):
+        await send_releases_list(message.chat.id)
 
 
 @dp.message(Command("set_interval"))
 async def cmd_set_interval(message: types.Message):
-    user_id = message.from_user.id
-    user_data[user_id] = {'chat_id': message.chat.id}
+    await remember_chat(message.from_user.id, message.chat.id)
     keyboard = InlineKeyboardBuilder()
     buttons = [("10 мин", 10), ("30 мин", 30), ("60 мин", 60), ("Выключить", 0)]
     for text, interval in buttons:
         keyboard.button(text=text, callback_data=f"int_{interval}")
     keyboard.adjust(2)
-    await message.answer("Выберите интервал автоматической проверки:", reply_markup=keyboard.as_markup())
+    await sender.send_message(message.chat.id, "Выберите интервал автоматической проверки:",
+                              reply_markup=keyboard.as_markup())
 
 
 @dp.callback_query(F.data.startswith("int_"))
@@ -400,27 +1052,18 @@ async def process_interval(callback: types.CallbackQuery):
     user_id = callback.from_user.id
     interval = int(callback.data.split("_")[1])
 
-    user_data[user_id]['interval'] = interval
+    user = user_data.setdefault(user_id, {'chat_id': callback.message.chat.id})
+    user['interval'] = interval
+    user['auto_report_baseline'] = False
+    sync_auto_report_jobs()
 
-    if 'job_id' in user_data[user_id]:
-        try:
-            scheduler.remove_job(user_data[user_id]['job_id'])
-        except:
-            pass
+    user['job_id'] = auto_report_job_id(interval) if interval > 0 else None
+    await save_user(user_id, user)
 
     if interval > 0:
-        job = scheduler.add_job(
-            send_auto_report,
-            IntervalTrigger(minutes=interval),
-            args=[user_id],
-            id=f"user_{user_id}",
-            replace_existing=True
-        )
-        user_data[user_id]['job_id'] = job.id
-        await callback.message.edit_text(f"✅ Автопроверка установлена: каждые {interval} минут")
+        await sender.edit_text(callback.message, f"✅ Автопроверка установлена: каждые {interval} минут")
     else:
-        user_data[user_id]['job_id'] = None
-        await callback.message.edit_text("✅ Автоматическая проверка выключена")
+        await sender.edit_text(callback.message, "✅ Автоматическая проверка выключена")
 
     await callback.answer()
 
@@ -428,31 +1071,35 @@ async def process_interval(callback: types.CallbackQuery):
 @dp.callback_query(F.data.startswith("rel_"))
 async def process_release(callback: types.CallbackQuery):
     release_name = callback.data.split("_", 1)[1]
-    await callback.message.edit_text(f"🔍 Проверяю релиз '{release_name}'...")
-    await show_release_details(callback.message.chat.id, release_name, show_review_only=False)
+    await sender.edit_text(callback.message, f"🔍 Проверяю релиз '{release_name}'...")
+    with latency_budget(RELEASE_REPORT_BUDGET):
+        await show_release_details(callback.message.chat.id, release_name, show_review_only=False)
     await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("review_"))
 async def process_review(callback: types.CallbackQuery):
     release_name = callback.data.split("_", 1)[1]
-    await callback.message.edit_text(f"👁‍🗨 Ищу задачи в Review для релиза '{release_name}'...")
-    await show_release_details(callback.message.chat.id, release_name, show_review_only=True)
+    await sender.edit_text(callback.message, f"👁‍🗨 Ищу задачи в Review для релиза '{release_name}'...")
+    with latency_budget(RELEASE_REPORT_BUDGET):
+        await show_release_details(callback.message.chat.id, release_name, show_review_only=True)
     await callback.answer()
 
 
 @dp.callback_query(F.data.startswith("links_"))
 async def process_links(callback: types.CallbackQuery):
     release_name = callback.data.split("_", 1)[1]
-    await callback.message.edit_text(f"🔗 Формирую ссылки для релиза '{release_name}'...")
-    await send_release_links(callback.message.chat.id, release_name)
+    await sender.edit_text(callback.message, f"🔗 Формирую ссылки для релиза '{release_name}'...")
+    with latency_budget(RELEASE_REPORT_BUDGET):
+        await send_release_links(callback.message.chat.id, release_name)
     await callback.answer()
 
 
 @dp.callback_query(F.data == "back_to_list")
 async def back_to_list(callback: types.CallbackQuery):
     await callback.message.delete()
-    await send_releases_list(callback.message.chat.id)
+    with latency_budget(RELEASES_LIST_BUDGET):
+        await send_releases_list(callback.message.chat.id)
     await callback.answer()
 
 
@@ -460,100 +1107,274 @@ async def back_to_list(callback: types.CallbackQuery):
 async def cmd_current(message: types.Message):
     user_id = message.from_user.id
     if user_id not in user_data:
-        await message.answer("Используйте /start")
+        await sender.send_message(message.chat.id, "Используйте /start")
         return
     interval = user_data[user_id].get('interval', 'Не установлен')
     text = f"<b>Текущие настройки:</b>\nИнтервал проверки: {interval if interval else 'Выключено'} минут"
-    await message.answer(text, parse_mode='HTML', reply_markup=get_main_keyboard())
+    await sender.send_message(message.chat.id, text, parse_mode='HTML', reply_markup=get_main_keyboard())
 
 
 # --- Автоматический отчёт ---
 
-async def send_auto_report(user_id: int):
-    if user_id not in user_data:
-        return
-    chat_id = user_data[user_id].get('chat_id')
-    if not chat_id:
-        return
-
+async def get_auto_report_release_names() -> Optional[List[str]]:
+    """Последние релизы по startDate, которые попадают в автоотчёт."""
     versions = await fetch_project_versions()
     if not versions:
-        return
+        return None
 
     versions.sort(key=lambda x: x.get('startDate', ''), reverse=True)
+    return [version.get('name', 'Без названия') for version in versions[:10]]
+
 
+def render_auto_report(summaries: List[Tuple[str, ReleaseSummary]]) -> Optional[str]:
+    """Собирает текст полного автоотчёта; None, если ни в одном релизе нет задач."""
     message = "<b>📊 АВТОМАТИЧЕСКАЯ ПРОВЕРКА</b>\n\n"
     total_tasks = 0
     total_review = 0
     shown_releases = 0
 
-    for version in versions[:10]:
-        release_name = version.get('name', 'Без названия')
-        issues = await fetch_jira_issues(release_name)
-        if issues:
-            total_tasks += len(issues)
+    for release_name, summary in summaries:
+        if summary.total:
+            total_tasks += summary.total
             shown_releases += 1
-            review_count = sum(1 for i in issues if "review" in i.get("fields", {}).get("status", {}).get("name", "").lower())
-            total_review += review_count
-
-            high_rework = 0
-            for issue in issues:
-                try:
-                    workratio = issue.get("fields", {}).get('customfield_11087', 0)
-                    if workratio and float(workratio) > 3:
-                        high_rework += 1
-                except:
-                    continue
+            total_review += summary.review
 
             message += f"<b>{release_name}</b>\n"
-            message += f"📋 {len(issues)} задач"
-            if review_count > 0:
-                message += f" | 👁‍🗨 {review_count} в ревью"
-            if high_rework > 0:
-                message += f" | ⚠️ {high_rework} с реворками"
+            message += f"📋 {summary.total} задач"
+            if summary.review > 0:
+                message += f" | 👁‍🗨 {summary.review} в ревью"
+            if summary.high_rework > 0:
+                message += f" | ⚠️ {summary.high_rework} с реворками"
             message += "\n\n"
 
-    if total_tasks > 0:
-        message += f"<b>📈 ИТОГО:</b> {shown_releases} релизов, {total_tasks} задач"
-        if total_review > 0:
-            message += f", {total_review} в ревью"
-        message += f"\n<b>⏰ Время:</b> {datetime.now().strftime('%H:%M %d.%m.%Y')}"
+    if total_tasks == 0:
+        return None
 
-        keyboard = InlineKeyboardBuilder()
-        keyboard.button(text="📋 Показать все релизы", callback_data="show_all_releases")
-        keyboard.button(text="👁‍🗨 Задачи в Review", callback_data="show_review_summary")
-        keyboard.adjust(1)
+    message += f"<b>📈 ИТОГО:</b> {shown_releases} релизов, {total_tasks} задач"
+    if total_review > 0:
+        message += f", {total_review} в ревью"
+    message += f"\n<b>⏰ Время:</b> {datetime.now().strftime('%H:%M %d.%m.%Y')}"
+    return message
+
+
+async def build_auto_report() -> Optional[str]:
+    """Собирает текст автоотчёта; None, если ни в одном релизе нет задач."""
+    release_names = await get_auto_report_release_names()
+    if not release_names:
+        return None
+
+    issues_by_release = await fetch_issues_for_releases(release_names)
+    return render_auto_report([(name, summarize_issues(issues))
+                               for name, issues in zip(release_names, issues_by_release)])
+
+
+async def collect_release_snapshots(previous: Dict[str, ReleaseSnapshot]) -> Optional[Dict[str, ReleaseSnapshot]]:
+    """Снимает состояние релизов автоотчёта.
+
+    Сначала загружаются только лёгкие поля; комментарии и MR анализируются
+    лишь для релизов, у которых изменился хэш содержимого.
+    """
+    release_names = await get_auto_report_release_names()
+    if release_names is None:
+        return None
+
+    issues_by_release = await fetch_issues_for_releases(release_names)
+    hashes = {name: release_content_hash(issues) for name, issues in zip(release_names, issues_by_release)}
+    changed = [name for name in release_names
+               if name not in previous or previous[name].content_hash != hashes[name]]
+
+    detailed: Dict[str, List[Issue]] = {}
+    if changed:
+        detailed = dict(zip(changed, await fetch_issues_for_releases(changed, DETAIL_FIELDS)))
+        await resolve_issue_services([issue for issues in detailed.values() for issue in issues])
+
+    snapshots: Dict[str, ReleaseSnapshot] = {}
+    for name in release_names:
+        if name in detailed:
+            snapshots[name] = ReleaseSnapshot(
+                content_hash=hashes[name],
+                issues={issue.key: IssueState.from_issue(issue) for issue in detailed[name]},
+            )
+        else:
+            snapshots[name] = previous[name]
+    return snapshots
+
+
+def render_auto_report_changes(previous: Dict[str, ReleaseSnapshot],
+                               current: Dict[str, ReleaseSnapshot]) -> Optional[str]:
+    """Собирает сообщение только об изменениях; None, если значимых изменений нет."""
+    sections = []
+    for release_name, snapshot in current.items():
+        changes = diff_snapshots(previous.get(release_name), snapshot)
+        if not changes:
+            continue
+        lines = [f"<b>{release_name}</b>"]
+        for key in changes.new:
+            lines.append(f"🆕 {key} - {snapshot.issues[key].summary}")
+        for key in changes.to_review:
+            lines.append(f"👁‍🗨 {key} → {snapshot.issues[key].status}")
+        for key in changes.to_deploy:
+            services = ", ".join(snapshot.issues[key].services) or "сервис не определён"
+            lines.append(f"🚀 {key} → Deploy ({services})")
+        for key in changes.high_rework:
+            lines.append(f"⚠️ {key} - Попыток QA: {snapshot.issues[key].rework_text}")
+        sections.append("\n".join(lines))
+
+    if not sections:
+        return None
+
+    return ("<b>📊 ИЗМЕНЕНИЯ В РЕЛИЗАХ</b>\n\n" + "\n\n".join(sections)
+            + f"\n\n<b>⏰ Время:</b> {datetime.now().strftime('%H:%M %d.%m.%Y')}")
+
+
+def get_auto_report_keyboard() -> types.InlineKeyboardMarkup:
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text="📋 Показать все релизы", callback_data="show_all_releases")
+    keyboard.button(text="👁‍🗨 Задачи в Review", callback_data="show_review_summary")
+    keyboard.adjust(1)
+    return keyboard.as_markup()
+
+
+async def send_auto_report(user_id: int):
+    if user_id not in user_data:
+        return
+    chat_id = user_data[user_id].get('chat_id')
+    if not chat_id:
+        return
+
+    with latency_budget(AUTO_REPORT_BUDGET):
+        message = await build_auto_report()
+    if message:
+        await sender.send_message(chat_id, message, priority=PRIORITY_BACKGROUND, parse_mode='HTML',
+                                  reply_markup=get_auto_report_keyboard())
 
-        await bot.send_message(chat_id, message, parse_mode='HTML', reply_markup=keyboard.as_markup())
+
+def auto_report_job_id(interval: int) -> str:
+    return f"auto_report_{interval}"
+
+
+def get_subscribers(interval: int) -> List[int]:
+    """Пользователи, подписанные на автоотчёт с указанным интервалом."""
+    return [user_id for user_id, data in user_data.items()
+            if data.get('interval') == interval and data.get('chat_id')]
+
+
+async def run_auto_report(interval: int):
+    """Один тик общего сборщика для всех подписчиков интервала.
+
+    Новый подписчик получает полный отчёт, остальные — только изменения
+    с прошлого тика; если ничего не изменилось, сообщение не отправляется.
+    Тик выполняет только экземпляр бота, держащий аренду интервала: он
+    продлевает её каждый тик, а после его остановки аренду забирает другой.
+    """
+    subscribers = get_subscribers(interval)
+    if not subscribers:
+        return
+    try:
+        if not await state_backend.acquire_lease(auto_report_job_id(interval), INSTANCE_ID, ttl=interval * 60 * 1.5):
+            return
+    except Exception as e:
+        print(f"⚠️ Ошибка получения аренды автоотчёта: {e}")
+        return
+
+    previous = auto_report_snapshots.get(interval)
+    with latency_budget(AUTO_REPORT_BUDGET):
+        current = await collect_release_snapshots(previous or {})
+    if current is None:
+        return
+    auto_report_snapshots[interval] = current
+
+    full_report = None
+    if any(not user_data[user_id].get('auto_report_baseline') for user_id in subscribers):
+        full_report = render_auto_report([(name, snapshot.summary) for name, snapshot in current.items()])
+    changes_report = render_auto_report_changes(previous, current) if previous is not None else None
+
+    keyboard = get_auto_report_keyboard()
+    sends = []
+    baselined: Dict[int, Dict[str, Any]] = {}
+    for user_id in subscribers:
+        user = user_data[user_id]
+        if not user.get('auto_report_baseline'):
+            message = full_report
+            user['auto_report_baseline'] = True
+            baselined[user_id] = user
+        else:
+            message = changes_report
+        if message:
+            sends.append(sender.send_message(user['chat_id'], message, priority=PRIORITY_BACKGROUND,
+                                             parse_mode='HTML', reply_markup=keyboard))
+    await asyncio.gather(*sends, return_exceptions=True)
+    if baselined:
+        try:
+            await state_backend.save_users(baselined)
+        except Exception as e:
+            print(f"⚠️ Ошибка сохранения подписчиков: {e}")
+
+
+def sync_auto_report_jobs():
+    """Держит ровно одну задачу планировщика на каждый интервал, у которого есть подписчики."""
+    intervals = {data.get('interval') for data in user_data.values() if data.get('interval')}
+    for job in scheduler.get_jobs():
+        if job.id.startswith("auto_report_") and int(job.id.rsplit("_", 1)[1]) not in intervals:
+            scheduler.remove_job(job.id)
+    for interval in list(auto_report_snapshots):
+        if interval not in intervals:
+            del auto_report_snapshots[interval]
+    for interval in intervals:
+        if scheduler.get_job(auto_report_job_id(interval)) is None:
+            scheduler.add_job(
+                run_auto_report,
+                IntervalTrigger(minutes=interval),
+                args=[interval],
+                id=auto_report_job_id(interval),
+            )
+
+
+async def sync_state() -> int:
+    """Перечитывает подписки из хранилища одним запросом и пересобирает задачи планировщика.
+
+    Нужна при старте и периодически, чтобы подписки, принятые другими
+    экземплярами бота, попадали в расписание. Возвращает число пользователей.
+    """
+    try:
+        users = await state_backend.load_users()
+    except Exception as e:
+        print(f"⚠️ Ошибка чтения состояния: {e}")
+        return len(user_data)
+    for user_id, data in users.items():
+        user_data.setdefault(user_id, {}).update(data)
+    sync_auto_report_jobs()
+    return len(user_data)
 
 
 @dp.callback_query(F.data == "show_all_releases")
 async def show_all_releases(callback: types.CallbackQuery):
-    await callback.message.edit_text("📋 Загружаю список релизов...")
-    await send_releases_list(callback.message.chat.id, from_auto_report=True)
+    await sender.edit_text(callback.message, "📋 Загружаю список релизов...")
+    with latency_budget(RELEASES_LIST_BUDGET):
+        await send_releases_list(callback.message.chat.id, from_auto_report=True, placeholder=callback.message)
     await callback.answer()
 
 
 @dp.callback_query(F.data == "show_review_summary")
 async def show_review_summary(callback: types.CallbackQuery):
-    versions = await fetch_project_versions()
-    if not versions:
-        await callback.message.edit_text("❌ Ошибка при получении данных")
-        return
+    with latency_budget(RELEASES_LIST_BUDGET):
+        versions = await fetch_project_versions()
+        if not versions:
+            await sender.edit_text(callback.message, "❌ Ошибка при получении данных")
+            return
 
-    versions.sort(key=lambda x: x.get('startDate', ''), reverse=True)
+        versions.sort(key=lambda x: x.get('startDate', ''), reverse=True)
+        release_names = [version.get('name', 'Без названия') for version in versions[:10]]
+        issues_by_release = await fetch_issues_for_releases(release_names)
 
     message = "<b>👁‍🗨 ЗАДАЧИ В СТАТУСЕ REVIEW</b>\n\n"
     total_review = 0
 
-    for version in versions[:10]:
-        release_name = version.get('name', 'Без названия')
-        issues = await fetch_jira_issues(release_name)
-        if issues:
-            review_issues = [i for i in issues if "review" in i.get("fields", {}).get("status", {}).get("name", "").lower()]
-            if review_issues:
-                total_review += len(review_issues)
-                message += f"<b>{release_name}</b> - {len(review_issues)} задач\n"
+    for release_name, issues in zip(release_names, issues_by_release):
+        review_count = summarize_issues(issues).review
+        if review_count:
+            total_review += review_count
+            message += f"<b>{release_name}</b> - {review_count} задач\n"
 
     if total_review > 0:
         message += f"\n<b>📊 Всего задач в Review:</b> {total_review}"
@@ -561,9 +1382,9 @@ async def show_review_summary(callback: types.CallbackQuery):
         keyboard.button(text="📋 Показать все релизы", callback_data="show_all_releases")
         keyboard.button(text="← Назад", callback_data="back_to_auto_report")
         keyboard.adjust(1)
-        await callback.message.edit_text(message, parse_mode='HTML', reply_markup=keyboard.as_markup())
+        await sender.edit_text(callback.message, message, parse_mode='HTML', reply_markup=keyboard.as_markup())
     else:
-        await callback.message.edit_text("📭 Нет задач в статусе Review")
+        await sender.edit_text(callback.message, "📭 Нет задач в статусе Review")
 
 
 @dp.callback_query(F.data == "back_to_auto_report")
@@ -572,23 +1393,262 @@ async def back_to_auto_report(callback: types.CallbackQuery):
     await callback.answer()
 
 
+# --- Обработка обновлений ---
+
+# Число обработчиков Telegram, выполняющихся или ожидающих очереди прямо сейчас
+active_handlers = 0
+
+# Обновления сверх лимита ждут свободного места, а не запускаются все сразу
+update_slots = asyncio.Semaphore(TELEGRAM_MAX_UPDATES)
+
+
+@dp.update.outer_middleware()
+async def track_active_handlers(handler, event, data):
+    global active_handlers
+    active_handlers += 1
+    try:
+        return await handler(event, data)
+    finally:
+        active_handlers -= 1
+
+
+@dp.update.outer_middleware()
+async def limit_concurrent_updates(handler, event, data):
+    async with update_slots:
+        return await handler(event, data)
+
+
+# --- Прогрев кэшей ---
+
+async def wait_until_idle():
+    """Фоновая работа уступает место интерактивным запросам пользователей."""
+    while active_handlers > 0:
+        await asyncio.sleep(WARMUP_IDLE_DELAY)
+
+
+async def warm_up() -> int:
+    """Заранее загружает версии, задачи и метаданные MR самых свежих невыпущенных релизов.
+
+    Релизы прогреваются по одному и только когда нет активных обработчиков,
+    поэтому прогрев не конкурирует с запросами пользователей.
+    Возвращает число прогретых релизов.
+    """
+    await wait_until_idle()
+    versions = await fetch_project_versions()
+    if not versions:
+        return 0
+
+    # Список релизов для /check и сводки автоотчёта
+    await wait_until_idle()
+    await fetch_release_counts([version.get('name', 'Без названия') for version in versions[:20]])
+
+    unreleased = [v for v in versions if not v.get('released') and not v.get('archived')]
+    unreleased.sort(key=lambda x: x.get('startDate', ''), reverse=True)
+
+    warmed = 0
+    for version in unreleased[:WARMUP_RELEASES]:
+        await wait_until_idle()
+        issues = await fetch_jira_issues(version.get('name', 'Без названия'))
+        await resolve_issue_services(issues)
+        warmed += 1
+    return warmed
+
+
+async def run_warm_up():
+    try:
+        await warm_up()
+    except Exception as e:
+        print(f"⚠️ Ошибка прогрева кэша: {e}")
+
+
+# --- Вебхуки Jira и индекс релизов ---
+
+# Фоновые дозагрузки задач по событиям вебхука
+webhook_tasks: set = set()
+
+
+async def load_issue(issue_key: str) -> Issue:
+    url = f"{API_URL}/issue/{urllib.parse.quote(issue_key)}"
+    raw = await http_client.request_json("jira", "GET", url, params={"fields": ",".join(INDEX_FIELDS)})
+    return parse_issue(raw)
+
+
+async def refresh_indexed_issue(issue_key: str):
+    """Перечитывает задачу из Jira, когда в событии нет всех нужных полей (например, комментариев)."""
+    try:
+        release_index.apply(await load_issue(issue_key))
+    except JIRA_ERRORS:
+        # Пропущенное изменение подхватит ближайшая сверка
+        pass
+
+
+async def handle_jira_webhook(payload: Dict[str, Any]):
+    """Применяет событие вебхука Jira к индексу релизов."""
+    event = payload.get("webhookEvent", "")
+    issue = payload.get("issue") or {}
+    issue_key = issue.get("key")
+    if not issue_key:
+        return
+
+    if event == "jira:issue_deleted":
+        release_index.remove(issue_key)
+        return
+
+    fields = issue.get("fields") or {}
+    if event.startswith("jira:issue_") and all(name in fields for name in INDEX_FIELDS if name != "key"):
+        release_index.apply(parse_issue(issue))
+    elif event.startswith(("jira:issue_", "comment_")):
+        task = asyncio.create_task(refresh_indexed_issue(issue_key))
+        webhook_tasks.add(task)
+        task.add_done_callback(webhook_tasks.discard)
+
+
+async def reconcile_release_index() -> bool:
+    """Сверяет индекс с Jira: заново загружает задачи последних JIRA_INDEX_RELEASES релизов.
+
+    Ловит пропущенные события вебхука. При ошибке Jira индекс не меняется.
+    """
+    versions = await fetch_project_versions()
+    if not versions:
+        return False
+    release_names = [version.get('name', 'Без названия') for version in versions[:JIRA_INDEX_RELEASES]]
+
+    semaphore = asyncio.Semaphore(JIRA_CONCURRENCY)
+
+    async def load_chunk(chunk: List[str]) -> List[Issue]:
+        jql = f"fixVersion in ({', '.join(jql_quote(name) for name in chunk)})"
+        async with semaphore:
+            return await collect_jira_issues(jql, INDEX_FIELDS)
+
+    try:
+        chunks = await asyncio.gather(*(load_chunk(release_names[i:i + JIRA_BULK_RELEASES])
+                                        for i in range(0, len(release_names), JIRA_BULK_RELEASES)))
+    except JIRA_ERRORS:
+        return False
+    release_index.replace_releases(release_names, (issue for chunk in chunks for issue in chunk))
+    return True
+
+
+async def run_reconcile():
+    try:
+        await reconcile_release_index()
+    except Exception as e:
+        print(f"⚠️ Ошибка сверки индекса релизов: {e}")
+
+
+async def start_jira_webhook() -> web.AppRunner:
+    """Запускает приёмник вебхуков Jira и периодическую сверку индекса."""
+    app = create_webhook_app(JIRA_WEBHOOK_PATH, handle_jira_webhook, secret=JIRA_WEBHOOK_SECRET or None)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, JIRA_WEBHOOK_HOST, JIRA_WEBHOOK_PORT).start()
+    scheduler.add_job(run_reconcile, IntervalTrigger(seconds=JIRA_INDEX_RECONCILE), id="reconcile_release_index",
+                      replace_existing=True, max_instances=1, coalesce=True)
+    await run_reconcile()
+    print(f"📬 Вебхуки Jira: http://{JIRA_WEBHOOK_HOST}:{JIRA_WEBHOOK_PORT}{JIRA_WEBHOOK_PATH}")
+    return runner
+
+
 # --- Запуск ---
 
+async def drain_updates(timeout: float) -> bool:
+    """Дожидается обработчиков, уже принявших обновления, и отправки их сообщений.
+
+    Возвращает False, если обработчики не завершились за timeout секунд.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while active_handlers > 0 and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+    await sender.close()
+    return active_handlers == 0
+
+
+async def run_polling():
+    try:
+        await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        await drain_updates(SHUTDOWN_TIMEOUT)
+        await bot.session.close()
+
+
+def create_telegram_webhook_app() -> web.Application:
+    """Приложение aiohttp, передающее обновления Telegram в диспетчер в фоне."""
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=TELEGRAM_WEBHOOK_SECRET or None).register(
+        app, path=TELEGRAM_WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook():
+    """Принимает обновления Telegram через вебхук до SIGINT/SIGTERM, затем корректно останавливается."""
+    runner = web.AppRunner(create_telegram_webhook_app())
+    await runner.setup()
+    site = web.TCPSite(runner, TELEGRAM_WEBHOOK_HOST, TELEGRAM_WEBHOOK_PORT)
+    await site.start()
+
+    # Адрес вебхука можно зарегистрировать и снаружи (например, один раз для всех реплик)
+    if TELEGRAM_WEBHOOK_URL:
+        await bot.set_webhook(
+            TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(TELEGRAM_MAX_UPDATES, 100),
+        )
+    print(f"🌐 Вебхук Telegram: {TELEGRAM_WEBHOOK_HOST}:{TELEGRAM_WEBHOOK_PORT}{TELEGRAM_WEBHOOK_PATH}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка по Ctrl+C через KeyboardInterrupt
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать обновления, затем дожидаемся начатых
+        await site.stop()
+        await drain_updates(SHUTDOWN_TIMEOUT)
+        await runner.cleanup()
+
+
 async def main():
+    restored = await sync_state()
+    if STATE_SYNC_INTERVAL > 0:
+        scheduler.add_job(sync_state, IntervalTrigger(seconds=STATE_SYNC_INTERVAL), id="sync_state",
+                          replace_existing=True, max_instances=1, coalesce=True)
     scheduler.start()
     print("🤖 Бот запущен")
+    print(f"👥 Восстановлено пользователей: {restored}")
     print(f"🔗 Jira URL: {JIRA_URL}")
     print(f"📁 Проект: {PROJECT_KEY}")
 
-    # Тестовый запрос
-    try:
-        issues = await fetch_jira_issues("1.10.2")
-        print(f"✅ Тест подключения: релиз '1.10.2' содержит {len(issues)} задач")
-    except Exception as e:
-        print(f"❌ Ошибка подключения: {e}")
+    # Прогрев при старте и затем периодически, чтобы первые экраны открывались из кэша
+    warm_up_task = asyncio.create_task(run_warm_up())
+    if WARMUP_INTERVAL > 0:
+        scheduler.add_job(run_warm_up, IntervalTrigger(seconds=WARMUP_INTERVAL), id="warm_up",
+                          replace_existing=True, max_instances=1, coalesce=True)
+
+    webhook_runner = await start_jira_webhook() if JIRA_WEBHOOK_PORT else None
 
-    await dp.start_polling(bot)
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook()
+        else:
+            await run_polling()
+    finally:
+        warm_up_task.cancel()
+        scheduler.shutdown(wait=False)
+        if webhook_runner is not None:
+            await webhook_runner.cleanup()
+        await http_client.close()
+        await state_backend.close()
+        mr_cache.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+# cache.py
+# Кэши: результаты поиска Jira (TTL + LRU) и метаданные merge request GitLab
+# Caches: Jira search results (TTL + LRU) and GitLab merge request metadata
+
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+@dataclass
+class CacheEntry:
+    """Значение в кэше и время его загрузки."""
+    value: Any
+    loaded_at: float
+    refreshed_at: float
+
+
+class TTLCache:
+    """LRU-кэш: записи устаревают через ttl секунд, при переполнении вытесняются самые старые.
+
+    Устаревшие записи не удаляются сразу: вызывающий код может обновить их
+    инкрементально, а при ошибке вернуть пользователю последние известные данные.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def now(self) -> float:
+        return self._clock()
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        """Возвращает запись (в том числе устаревшую) и обновляет счётчики."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        if self.is_fresh(entry):
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """Возвращает запись без изменения счётчиков и порядка вытеснения."""
+        return self._data.get(key)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return self._clock() - entry.refreshed_at < self.ttl
+
+    def set(self, key: Hashable, value: Any, loaded_at: Optional[float] = None) -> CacheEntry:
+        """Сохраняет значение; loaded_at сохраняется при инкрементальном обновлении."""
+        now = self._clock()
+        entry = CacheEntry(value=value, loaded_at=now if loaded_at is None else loaded_at, refreshed_at=now)
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def pop(self, key: Hashable) -> Optional[CacheEntry]:
+        return self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики попаданий и промахов для подбора TTL."""
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+        }
+
+
+@dataclass(frozen=True)
+class MergeRequestInfo:
+    """Метаданные merge request, нужные для определения сервиса."""
+    target_branch: Optional[str]
+    state: str
+
+
+class MergeRequestCache:
+    """Кэш метаданных MR по (проект, iid).
+
+    Слитые и закрытые MR почти не меняются и хранятся долго, открытые — недолго.
+    Устаревшие записи можно получить явно, когда GitLab недоступен.
+    Если задан db_path, записи сохраняются в SQLite и переживают перезапуск.
+    """
+
+    FINAL_STATES = frozenset({"merged", "closed"})
+
+    def __init__(self, open_ttl: float, final_ttl: float, maxsize: int = 10000,
+                 db_path: Optional[str] = None, clock: Callable[[], float] = time.time):
+        self.open_ttl = open_ttl
+        self.final_ttl = final_ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: "OrderedDict[Tuple[str, str], Tuple[MergeRequestInfo, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str):
+        self._db = sqlite3.connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS merge_requests ("
+            "project TEXT NOT NULL, iid TEXT NOT NULL, target_branch TEXT, state TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (project, iid))"
+        )
+        now = self._clock()
+        self._db.execute("DELETE FROM merge_requests WHERE expires_at <= ?", (now,))
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT project, iid, target_branch, state, expires_at FROM merge_requests ORDER BY expires_at"
+        )
+        for project, iid, target_branch, state, expires_at in rows:
+            self._data[(project, iid)] = (MergeRequestInfo(target_branch, state), expires_at)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, project: str, iid: str, allow_expired: bool = False) -> Optional[MergeRequestInfo]:
+        """Возвращает метаданные MR; allow_expired — отдать и устаревшие, если GitLab недоступен.
+
+        Устаревшие записи остаются в памяти до вытеснения или перезаписи.
+        """
+        key = (project, str(iid))
+        item = self._data.get(key)
+        if allow_expired:
+            return item[0] if item is not None else None
+        if item is None or item[1] <= self._clock():
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, project: str, iid: str, info: MergeRequestInfo):
+        ttl = self.final_ttl if info.state in self.FINAL_STATES else self.open_ttl
+        key = (project, str(iid))
+        expires_at = self._clock() + ttl
+        self._data[key] = (info, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO merge_requests VALUES (?, ?, ?, ?, ?)",
+                (key[0], key[1], info.target_branch, info.state, expires_at),
+            )
+            self._db.commit()
+
+    def clear(self):
+        self._data.clear()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
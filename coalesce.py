@@ -0,0 +1,65 @@
+# coalesce.py
+# Объединение одинаковых одновременных запросов к Jira и GitLab (single-flight)
+# Coalescing of identical concurrent Jira and GitLab calls (single-flight)
+
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Пока запрос с ключом выполняется, остальные вызовы с тем же ключом ждут его результат.
+
+    Ключ — кортеж, первый элемент которого задаёт вид запроса ("jira", "versions", "mr");
+    по нему ведутся счётчики выполненных и объединённых вызовов.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls: Counter = Counter()
+        self.coalesced: Counter = Counter()
+
+    def pending(self, key: Tuple) -> Optional[asyncio.Future]:
+        """Возвращает общий результат уже выполняющегося запроса, если он есть."""
+        future = self._inflight.get(key)
+        if future is not None and future.get_loop() is asyncio.get_running_loop() and not future.done():
+            self.coalesced[key[0]] += 1
+            return future
+        return None
+
+    def start(self, key: Tuple) -> asyncio.Future:
+        """Регистрирует вызывающего как ведущего: он обязан завершить future через finish()."""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.calls[key[0]] += 1
+        return future
+
+    def finish(self, key: Tuple, future: asyncio.Future, result: Any = None,
+               error: Optional[BaseException] = None):
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+                # Ошибку получат ожидающие; если их нет, не шумим в логах
+                future.exception()
+            else:
+                future.set_result(result)
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    async def do(self, key: Tuple, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполняет call один раз на все одновременные вызовы с одинаковым ключом."""
+        shared = self.pending(key)
+        if shared is not None:
+            return await asyncio.shield(shared)
+        future = self.start(key)
+        try:
+            result = await call()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {kind: {"calls": self.calls[kind], "coalesced": self.coalesced[kind]}
+                for kind in sorted(set(self.calls) | set(self.coalesced))}
@@ -0,0 +1,221 @@
+# fake_upstreams.py
+# Локальные поддельные серверы Jira и GitLab для бенчмарков и нагрузочных тестов
+# Local fake Jira and GitLab servers for benchmarks and load tests
+
+import asyncio
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+STATUSES = ["Open", "In Progress", "Code Review", "Deploy", "Done"]
+SIMPLE_SERVICE_PATHS = ["microbackend/integrations/fundist", "microbackend/bettingservice/", "fortunewheelservice/"]
+
+QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"')
+FIX_VERSION_IN = re.compile(r'fixVersion\s+in\s+\(([^)]*)\)')
+FIX_VERSION_EQ = re.compile(r'fixVersion\s*=\s*("(?:[^"\\]|\\.)*")')
+STATUS_IN = re.compile(r'status\s+in\s+\(([^)]*)\)')
+
+
+@dataclass
+class FakeDataset:
+    """Параметры синтетических релизов."""
+    releases: int = 20
+    issues_per_release: int = 50
+    comments_per_issue: int = 3
+    comment_size: int = 300
+    mr_links_per_issue: int = 1
+    mr_repo: str = "gitlab.com/your-organization/backend"
+    target_branch: str = "main"
+    seed: int = 1
+
+
+def _unquote(value: str) -> str:
+    return value.replace('\\"', '"').replace('\\\\', '\\')
+
+
+def _quoted_names(text: str) -> List[str]:
+    return [_unquote(name) for name in QUOTED.findall(text)]
+
+
+class FakeUpstreams:
+    """Поддельные Jira и GitLab на aiohttp с задержкой ответа и счётчиками запросов.
+
+    Jira отвечает на /search/jql (с постраничной выдачей), /search/approximate-count,
+    /project/{key}/versions, /project/{key}/statuses и /issue/{key}; GitLab —
+    на /projects/{id}/merge_requests и /projects/{id}/merge_requests/{iid}.
+    """
+
+    def __init__(self, dataset: Optional[FakeDataset] = None, jira_latency: float = 0.0,
+                 gitlab_latency: float = 0.0, page_size_limit: int = 100):
+        self.dataset = dataset or FakeDataset()
+        self.jira_latency = jira_latency
+        self.gitlab_latency = gitlab_latency
+        self.page_size_limit = page_size_limit
+        self.calls: Counter = Counter()
+        self.versions: List[Dict[str, Any]] = []
+        self.issues: List[Dict[str, Any]] = []
+        self.merge_requests: Dict[str, Dict[str, Any]] = {}
+        self._generate()
+        self.jira_server = TestServer(self._jira_app())
+        self.gitlab_server = TestServer(self._gitlab_app())
+
+    # --- Данные ---
+
+    def _generate(self):
+        data = self.dataset
+        rng = random.Random(data.seed)
+        mr_iid = 0
+        for release in range(data.releases):
+            name = f"{release + 1}.0.0"
+            self.versions.append({"id": str(release), "name": name, "released": release < data.releases // 2,
+                                  "startDate": f"2024-{release % 12 + 1:02d}-01"})
+            for number in range(data.issues_per_release):
+                key = f"BACK-{release * data.issues_per_release + number + 1}"
+                comments = []
+                for index in range(data.comments_per_issue):
+                    words = [f"{rng.choice(SIMPLE_SERVICE_PATHS)}" if index == 0 else "проверено"]
+                    if index < data.mr_links_per_issue:
+                        mr_iid += 1
+                        words.append(f"https://{data.mr_repo}/-/merge_requests/{mr_iid}")
+                        self.merge_requests[str(mr_iid)] = {
+                            "iid": mr_iid,
+                            "target_branch": data.target_branch if rng.random() < 0.5 else "develop",
+                            "state": rng.choice(["merged", "opened"]),
+                        }
+                    filler = "lorem ipsum dolor sit amet "
+                    text = " ".join(words) + " " + filler * max(0, (data.comment_size - 40) // len(filler))
+                    comments.append({"id": f"{key}-{index}", "body": {
+                        "type": "doc", "version": 1,
+                        "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}],
+                    }})
+                self.issues.append({"key": key, "fields": {
+                    "summary": f"Задача {key}",
+                    "status": {"name": rng.choice(STATUSES)},
+                    "customfield_11087": rng.randint(0, 5),
+                    "updated": "2024-01-01T00:00:00.000+0000",
+                    "fixVersions": [{"name": name}],
+                    "comment": {"comments": comments, "total": len(comments)},
+                }})
+
+    def select(self, jql: str) -> List[Dict[str, Any]]:
+        """Задачи, подходящие под JQL вида fixVersion = / in (...) [AND status in (...)]."""
+        if "updated >=" in jql:
+            # Синтетические задачи не меняются
+            return []
+        match = FIX_VERSION_IN.search(jql)
+        names = set(_quoted_names(match.group(1))) if match else set()
+        match = FIX_VERSION_EQ.search(jql)
+        if match:
+            names.add(_quoted_names(match.group(1))[0])
+        match = STATUS_IN.search(jql)
+        statuses = set(_quoted_names(match.group(1))) if match else None
+        return [issue for issue in self.issues
+                if any(v["name"] in names for v in issue["fields"]["fixVersions"])
+                and (statuses is None or issue["fields"]["status"]["name"] in statuses)]
+
+    @staticmethod
+    def project(issue: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+        return {"key": issue["key"], "fields": {name: issue["fields"][name] for name in fields
+                                                if name in issue["fields"]}}
+
+    # --- Серверы ---
+
+    async def _delay(self, latency: float):
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def _jira_app(self) -> web.Application:
+        async def search(request: web.Request) -> web.Response:
+            self.calls["jira.search"] += 1
+            await self._delay(self.jira_latency)
+            payload = await request.json()
+            issues = self.select(payload.get("jql", ""))
+            start = int(payload.get("nextPageToken") or 0)
+            size = min(int(payload.get("maxResults", 50)), self.page_size_limit)
+            page = issues[start:start + size]
+            fields = payload.get("fields") or []
+            body: Dict[str, Any] = {"issues": [self.project(issue, fields) for issue in page],
+                                    "isLast": start + size >= len(issues)}
+            if not body["isLast"]:
+                body["nextPageToken"] = str(start + size)
+            return web.json_response(body)
+
+        async def count(request: web.Request) -> web.Response:
+            self.calls["jira.count"] += 1
+            await self._delay(self.jira_latency)
+            payload = await request.json()
+            return web.json_response({"count": len(self.select(payload.get("jql", "")))})
+
+        async def versions(request: web.Request) -> web.Response:
+            self.calls["jira.versions"] += 1
+            await self._delay(self.jira_latency)
+            return web.json_response(self.versions)
+
+        async def statuses(request: web.Request) -> web.Response:
+            self.calls["jira.statuses"] += 1
+            await self._delay(self.jira_latency)
+            return web.json_response([{"name": "Task", "statuses": [{"name": name} for name in STATUSES]}])
+
+        async def issue(request: web.Request) -> web.Response:
+            self.calls["jira.issue"] += 1
+            await self._delay(self.jira_latency)
+            key = request.match_info["key"]
+            for item in self.issues:
+                if item["key"] == key:
+                    return web.json_response(item)
+            return web.json_response({}, status=404)
+
+        app = web.Application()
+        app.router.add_post("/rest/api/3/search/jql", search)
+        app.router.add_post("/rest/api/3/search/approximate-count", count)
+        app.router.add_get("/rest/api/3/project/{key}/versions", versions)
+        app.router.add_get("/rest/api/3/project/{key}/statuses", statuses)
+        app.router.add_get("/rest/api/3/issue/{key}", issue)
+        return app
+
+    def _gitlab_app(self) -> web.Application:
+        async def merge_requests(request: web.Request) -> web.Response:
+            self.calls["gitlab.merge_requests"] += 1
+            await self._delay(self.gitlab_latency)
+            iids = request.query.getall("iids[]", [])
+            return web.json_response([self.merge_requests[iid] for iid in iids if iid in self.merge_requests])
+
+        async def merge_request(request: web.Request) -> web.Response:
+            self.calls["gitlab.merge_request"] += 1
+            await self._delay(self.gitlab_latency)
+            item = self.merge_requests.get(request.match_info["iid"])
+            return web.json_response(item or {}, status=200 if item else 404)
+
+        app = web.Application()
+        app.router.add_get(r"/api/v4/projects/{project:.+}/merge_requests", merge_requests)
+        app.router.add_get(r"/api/v4/projects/{project:.+}/merge_requests/{iid:\d+}", merge_request)
+        return app
+
+    # --- Запуск ---
+
+    @property
+    def jira_url(self) -> str:
+        return str(self.jira_server.make_url("")).rstrip("/")
+
+    @property
+    def gitlab_api_url(self) -> str:
+        return str(self.gitlab_server.make_url("/api/v4"))
+
+    async def start(self):
+        await self.jira_server.start_server()
+        await self.gitlab_server.start_server()
+
+    async def close(self):
+        await self.jira_server.close()
+        await self.gitlab_server.close()
+
+    def use_in(self, bot_module: Any):
+        """Направляет запросы бота (модуль bot) на поддельные серверы."""
+        bot_module.API_URL = f"{self.jira_url}/rest/api/3"
+        bot_module.GITLAB_API_URL = self.gitlab_api_url
+        bot_module.JIRA_URL = self.jira_url
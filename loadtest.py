@@ -0,0 +1,251 @@
+# loadtest.py
+# Нагрузочный тест: много одновременных пользователей Telegram против локальных Jira и GitLab
+# Load test: many concurrent Telegram users against local fake Jira and GitLab
+#
+# Пример / Example:
+#   python loadtest.py --users 50 --actions 10 --mix check=4,rel=3,review=2,links=1 --telegram-latency 0.05
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import benchmark  # noqa: F401  (задаёт переменные окружения до импорта бота)
+import bot
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import Update
+from benchmark import percentile, reset_caches
+from fake_upstreams import FakeDataset, FakeUpstreams
+from sender import MessageSender, TokenBucket
+from state import SQLiteStateBackend
+
+DEFAULT_MIX = "check=4,rel=3,review=2,links=1"
+
+
+class FakeTelegramSession(BaseSession):
+    """Сессия Bot API без сети: записывает вызовы, имитирует задержку и flood control.
+
+    Если чат получает запросы быстрее chat_rate в секунду, отвечает 429 с
+    retry_after, как настоящий Telegram.
+    """
+
+    def __init__(self, latency: float = 0.0, chat_rate: float = 1.0, chat_burst: float = 3.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.calls: Counter = Counter()
+        self.flood_errors = 0
+        self._buckets: Dict[Any, TokenBucket] = {}
+        self._message_ids = itertools.count(1000)
+
+    async def make_request(self, bot: Bot, method: Any, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None and self.chat_rate > 0:
+            bucket = self._buckets.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+            wait = bucket.delay()
+            if wait > 0:
+                self.flood_errors += 1
+                content = {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                           "parameters": {"retry_after": max(1, round(wait))}}
+                self.check_response(bot, method, 429, json.dumps(content))
+            bucket.take()
+
+        result: Any = True
+        if isinstance(method, (SendMessage, EditMessageText)):
+            result = {
+                "message_id": getattr(method, "message_id", None) or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": method.text,
+            }
+        response = self.check_response(bot, method, 200, json.dumps({"ok": True, "result": result}))
+        return response.result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class UpdateFactory:
+    """Синтетические обновления Telegram: команды и нажатия инлайн-кнопок."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"}
+
+    def _message(self, user_id: int, text: str) -> Dict[str, Any]:
+        return {"message_id": next(self._ids), "date": int(time.time()), "text": text,
+                "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id)}
+
+    def command(self, user_id: int, text: str) -> Dict[str, Any]:
+        return {"update_id": next(self._ids), "message": self._message(user_id, text)}
+
+    def callback(self, user_id: int, data: str) -> Dict[str, Any]:
+        return {"update_id": next(self._ids), "callback_query": {
+            "id": str(next(self._ids)), "from": self._user(user_id), "chat_instance": str(user_id),
+            "data": data, "message": self._message(user_id, "📋 Выберите релиз для просмотра задач:"),
+        }}
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Разбирает долю действий: check=4,rel=3,review=2,links=1."""
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = int(weight or 1)
+    unknown = set(weights) - {"check", "rel", "review", "links"}
+    if unknown:
+        raise ValueError(f"Неизвестные действия: {', '.join(sorted(unknown))}")
+    return weights
+
+
+async def monitor_loop_lag(samples: List[float], interval: float = 0.05):
+    """Измеряет, насколько позже запланированного просыпается цикл событий."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, (loop.time() - started - interval) * 1000))
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"count": 0}
+    return {"count": len(latencies), "p50_ms": round(percentile(latencies, 50), 3),
+            "p99_ms": round(percentile(latencies, 99), 3), "max_ms": round(max(latencies), 3)}
+
+
+async def run_load_test(users: int, actions: int, mix: Dict[str, int], dataset: FakeDataset,
+                        jira_latency: float = 0.0, gitlab_latency: float = 0.0, telegram_latency: float = 0.0,
+                        telegram_chat_rate: float = 1.0, think_time: float = 0.0, seed: int = 1) -> Dict[str, Any]:
+    """Запускает users пользователей, каждый выполняет actions действий по смеси mix."""
+    upstreams = FakeUpstreams(dataset, jira_latency=jira_latency, gitlab_latency=gitlab_latency)
+    await upstreams.start()
+    upstreams.use_in(bot)
+    reset_caches()
+
+    session = FakeTelegramSession(latency=telegram_latency, chat_rate=telegram_chat_rate,
+                                  chat_burst=bot.TELEGRAM_CHAT_BURST)
+    load_bot = Bot(token=bot.BOT_TOKEN, session=session)
+    bot.bot = load_bot
+    # Очередь бота настроена как в бою; лимиты Telegram имитирует сессия
+    bot.sender = MessageSender(load_bot, global_rate=bot.TELEGRAM_GLOBAL_RATE, chat_rate=bot.TELEGRAM_CHAT_RATE,
+                               chat_burst=bot.TELEGRAM_CHAT_BURST)
+    bot.state_backend = SQLiteStateBackend(":memory:")
+
+    rng = random.Random(seed)
+    factory = UpdateFactory()
+    release_names = [version["name"] for version in upstreams.versions]
+    names, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Counter = Counter()
+    lag_samples: List[float] = []
+
+    async def simulate_user(user_id: int):
+        for _ in range(actions):
+            action = rng.choices(names, weights)[0]
+            if action == "check":
+                raw = factory.command(user_id, "/check")
+            else:
+                raw = factory.callback(user_id, f"{action}_{rng.choice(release_names)}")
+            update = Update.model_validate(raw, context={"bot": load_bot})
+            started = time.perf_counter()
+            try:
+                await bot.dp.feed_update(load_bot, update)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+            latencies[action].append((time.perf_counter() - started) * 1000)
+            if think_time > 0:
+                await asyncio.sleep(rng.uniform(0, 2 * think_time))
+
+    monitor = asyncio.create_task(monitor_loop_lag(lag_samples))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(simulate_user(user_id) for user_id in range(1, users + 1)))
+        elapsed = time.perf_counter() - started
+    finally:
+        monitor.cancel()
+        await bot.sender.close()
+        await bot.http_client.close()
+        await upstreams.close()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "users": users,
+        "actions_per_user": actions,
+        "duration_s": round(elapsed, 3),
+        "throughput_per_s": round(len(all_latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(all_latencies),
+        "latency_by_action": {name: summarize(values) for name, values in latencies.items()},
+        "loop_lag": summarize(lag_samples),
+        "errors": dict(errors),
+        "telegram_calls": dict(sorted(session.calls.items())),
+        "telegram_flood_errors": session.flood_errors,
+        "upstream_calls": dict(sorted(upstreams.calls.items())),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с поддельными Telegram, Jira и GitLab")
+    parser.add_argument("--users", type=int, nargs="+", default=[10], help="числа одновременных пользователей")
+    parser.add_argument("--actions", type=int, default=5, help="действий на пользователя")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="доли действий check/rel/review/links")
+    parser.add_argument("--releases", type=int, default=20)
+    parser.add_argument("--issues", type=int, default=50, help="задач в каждом релизе")
+    parser.add_argument("--comment-size", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка Jira и GitLab, сек")
+    parser.add_argument("--telegram-latency", type=float, default=0.03, help="задержка Bot API, сек")
+    parser.add_argument("--telegram-chat-rate", type=float, default=1.0,
+                        help="сообщений в секунду на чат до 429 (0 — без ограничения)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза между действиями, сек")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="loadtest_results.json")
+    args = parser.parse_args(argv)
+
+    dataset = FakeDataset(releases=args.releases, issues_per_release=args.issues, comment_size=args.comment_size,
+                          mr_repo=str(bot.SERVICE_PATTERNS[0]["pattern"]), target_branch=bot.TARGET_BRANCH,
+                          seed=args.seed)
+    mix = parse_mix(args.mix)
+    runs = []
+    for users in args.users:
+        result = asyncio.run(run_load_test(users, args.actions, mix, dataset, jira_latency=args.latency,
+                                           gitlab_latency=args.latency, telegram_latency=args.telegram_latency,
+                                           telegram_chat_rate=args.telegram_chat_rate,
+                                           think_time=args.think_time, seed=args.seed))
+        runs.append(result)
+        latency, lag = result["latency"], result["loop_lag"]
+        print(f"👥 {users:4} users: {result['throughput_per_s']:8.2f} actions/s  "
+              f"p50 {latency.get('p50_ms', 0):9.2f} ms  p99 {latency.get('p99_ms', 0):9.2f} ms  "
+              f"loop lag p99 {lag.get('p99_ms', 0):7.2f} ms  429s {result['telegram_flood_errors']}")
+
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "mix": mix,
+                 "dataset": vars(dataset), "jira_latency": args.latency,
+                 "telegram_latency": args.telegram_latency, "telegram_chat_rate": args.telegram_chat_rate},
+        "runs": runs,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📄 Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# matcher.py
+# Поиск правил SERVICE_PATTERNS в тексте комментария за один проход
+# Single-pass lookup of SERVICE_PATTERNS rules in comment text
+
+import re
+from typing import Dict, List
+
+URL_PATTERN = re.compile(r'(https?://[^\s]+)')
+
+
+class ServiceMatcher:
+    """Правила сервисов, скомпилированные в одно регулярное выражение.
+
+    Выражение вида (?=(p1|p2|...)) проверяется в каждой позиции текста и
+    находит самый длинный шаблон, начинающийся в ней. Шаблоны, являющиеся
+    префиксом найденного, совпадают в той же позиции, поэтому заранее
+    вычисляется, какие правила подразумевает каждое совпадение.
+    """
+
+    def __init__(self, rules: List[Dict]):
+        self.rules = rules
+        self.patterns = [str(rule["pattern"]).lower() for rule in rules]
+        unique = sorted({p for p in self.patterns if p}, key=len, reverse=True)
+        self._regex = re.compile("(?=(" + "|".join(map(re.escape, unique)) + "))") if unique else None
+        self._implied: Dict[str, List[int]] = {
+            found: [i for i, pattern in enumerate(self.patterns) if pattern and found.startswith(pattern)]
+            for found in unique
+        }
+
+    def match(self, text: str) -> List[int]:
+        """Возвращает индексы правил, встречающихся в тексте (текст уже в нижнем регистре)."""
+        if self._regex is None:
+            return []
+        found = set()
+        for match in self._regex.finditer(text):
+            found.update(self._implied[match.group(1)])
+            if len(found) == len(self.rules):
+                break
+        return sorted(found)
+
+    @staticmethod
+    def extract_urls(text: str) -> List[str]:
+        return URL_PATTERN.findall(text)
@@ -0,0 +1,148 @@
+# models.py
+# Компактная модель задачи Jira, сводка и снимки релиза
+# Compact Jira issue model, release summary and release snapshots
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Задача с числом попыток QA больше порога считается «с реворками»
+REWORK_THRESHOLD = 3
+
+
+def is_review_status(status: str) -> bool:
+    """Проверяет, относится ли статус задачи к ревью."""
+    status = status.lower()
+    return "review" in status or "ревью" in status
+
+
+def parse_rework(value: Any) -> Optional[float]:
+    """Приводит поле реворков (customfield_11087) к числу."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+@dataclass
+class Issue:
+    """Задача Jira, разобранная один раз при загрузке.
+
+    Хранит только то, что нужно отчётам: статус уже классифицирован,
+    реворки приведены к числу, а вместо сырых комментариев лежит план
+    определения сервисов (найденные правила и ссылки на MR).
+    """
+    __slots__ = ("key", "summary", "status", "is_review", "is_deploy", "rework", "rework_text",
+                 "updated", "fix_versions", "service_plan", "services")
+
+    key: str
+    summary: Optional[str]
+    status: str
+    is_review: bool
+    is_deploy: bool
+    rework: Optional[float]
+    rework_text: str
+    updated: Optional[str]
+    fix_versions: Tuple[str, ...]
+    service_plan: List[Tuple]
+    services: List[str]
+
+    @property
+    def has_high_rework(self) -> bool:
+        return self.rework is not None and self.rework > REWORK_THRESHOLD
+
+
+@dataclass
+class ReleaseSummary:
+    """Счётчики релиза для списка релизов и автоотчёта."""
+    total: int = 0
+    review: int = 0
+    high_rework: int = 0
+
+
+def summarize_issues(issues: Iterable[Issue]) -> ReleaseSummary:
+    """Считает задачи, задачи в ревью и задачи с реворками за один проход."""
+    summary = ReleaseSummary()
+    for issue in issues:
+        summary.total += 1
+        if issue.is_review:
+            summary.review += 1
+        if issue.has_high_rework:
+            summary.high_rework += 1
+    return summary
+
+
+def release_content_hash(issues: Iterable[Issue]) -> str:
+    """Хэш содержимого релиза: меняется при добавлении задачи, смене статуса, реворков или комментариев."""
+    digest = hashlib.sha1()
+    for issue in sorted(issues, key=lambda i: i.key):
+        digest.update(f"{issue.key}|{issue.status}|{issue.rework_text}|{issue.updated}\n".encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class IssueState:
+    """Состояние задачи в снимке релиза для автоотчёта."""
+    __slots__ = ("summary", "status", "is_review", "is_deploy", "rework", "rework_text", "services")
+
+    summary: Optional[str]
+    status: str
+    is_review: bool
+    is_deploy: bool
+    rework: Optional[float]
+    rework_text: str
+    services: Tuple[str, ...]
+
+    @classmethod
+    def from_issue(cls, issue: Issue) -> "IssueState":
+        return cls(issue.summary, issue.status, issue.is_review, issue.is_deploy, issue.rework,
+                   issue.rework_text, tuple(issue.services))
+
+    @property
+    def has_high_rework(self) -> bool:
+        return self.rework is not None and self.rework > REWORK_THRESHOLD
+
+
+@dataclass
+class ReleaseSnapshot:
+    """Снимок релиза на момент тика автоотчёта."""
+    content_hash: str
+    issues: Dict[str, IssueState] = field(default_factory=dict)
+
+    @property
+    def summary(self) -> ReleaseSummary:
+        return summarize_issues(self.issues.values())
+
+
+@dataclass
+class ReleaseChanges:
+    """Значимые изменения релиза между двумя снимками."""
+    new: List[str] = field(default_factory=list)
+    to_review: List[str] = field(default_factory=list)
+    to_deploy: List[str] = field(default_factory=list)
+    high_rework: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.new or self.to_review or self.to_deploy or self.high_rework)
+
+
+def diff_snapshots(old: Optional[ReleaseSnapshot], new: ReleaseSnapshot) -> ReleaseChanges:
+    """Сравнивает снимки: новые задачи, переходы в Review/Deploy, превышение порога реворков."""
+    changes = ReleaseChanges()
+    if old is not None and old.content_hash == new.content_hash:
+        return changes
+    previous = old.issues if old is not None else {}
+    for key, state in new.issues.items():
+        before = previous.get(key)
+        if before is None:
+            changes.new.append(key)
+        else:
+            if state.is_review and not before.is_review:
+                changes.to_review.append(key)
+            if state.is_deploy and not before.is_deploy:
+                changes.to_deploy.append(key)
+        if state.has_high_rework and (before is None or not before.has_high_rework):
+            changes.high_rework.append(key)
+    return changes
@@ -0,0 +1,85 @@
+# release_index.py
+# Индекс релиз → задачи в памяти, обновляемый вебхуками Jira и периодической сверкой
+# In-memory release → issues index kept up to date by Jira webhooks and periodic reconcile
+
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from models import Issue
+
+
+class ReleaseIndex:
+    """Задачи отслеживаемых релизов, из которых экраны строятся без запросов к Jira.
+
+    Набор релизов и их полное содержимое задаёт сверка (replace_releases),
+    между сверками задачи обновляются событиями вебхука (apply/remove).
+    Если сверка давно не проходила, индекс считается устаревшим и
+    get() возвращает None — тогда данные берутся из Jira как обычно.
+    """
+
+    def __init__(self, max_age: float, clock: Callable[[], float] = time.monotonic):
+        self.max_age = max_age
+        self._clock = clock
+        self._issues: Dict[str, Issue] = {}
+        # Релиз → ключи задач в порядке появления
+        self._releases: Dict[str, Dict[str, None]] = {}
+        self.reconciled_at: Optional[float] = None
+        self.events = 0
+
+    def is_ready(self) -> bool:
+        return self.reconciled_at is not None and self._clock() - self.reconciled_at < self.max_age
+
+    def tracks(self, release_name: str) -> bool:
+        return release_name in self._releases
+
+    def get(self, release_name: str) -> Optional[List[Issue]]:
+        """Задачи релиза или None, если релиз не отслеживается или индекс устарел."""
+        keys = self._releases.get(release_name)
+        if keys is None or not self.is_ready():
+            return None
+        return [self._issues[key] for key in keys]
+
+    def replace_releases(self, release_names: Iterable[str], issues: Iterable[Issue]):
+        """Полностью заменяет содержимое индекса результатом сверки с Jira.
+
+        Если вебхук успел принести более новую версию задачи, пока шла сверка,
+        она сохраняется.
+        """
+        previous = self._issues
+        self._issues = {}
+        self._releases = {name: {} for name in release_names}
+        for issue in issues:
+            known = previous.get(issue.key)
+            if known is not None and known.updated and issue.updated and known.updated > issue.updated:
+                issue = known
+            self._add(issue)
+        self.reconciled_at = self._clock()
+
+    def apply(self, issue: Issue):
+        """Применяет изменение задачи из вебхука: обновляет её и состав релизов."""
+        self.events += 1
+        self.remove(issue.key, count=False)
+        self._add(issue)
+
+    def remove(self, key: str, count: bool = True):
+        """Убирает задачу из всех релизов (например, после её удаления в Jira)."""
+        if count:
+            self.events += 1
+        issue = self._issues.pop(key, None)
+        if issue is None:
+            return
+        for name in issue.fix_versions:
+            keys = self._releases.get(name)
+            if keys is not None:
+                keys.pop(key, None)
+
+    def _add(self, issue: Issue):
+        tracked = [name for name in issue.fix_versions if name in self._releases]
+        if not tracked:
+            return
+        self._issues[issue.key] = issue
+        for name in tracked:
+            self._releases[name][issue.key] = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"releases": len(self._releases), "issues": len(self._issues), "events": self.events}
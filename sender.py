@@ -0,0 +1,217 @@
+# sender.py
+# Очередь исходящих сообщений Telegram с ограничением скорости (token bucket)
+# Outbound Telegram message queue with token-bucket rate limiting
+
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+# Приоритеты отправки: ответы пользователю идут раньше плановых отчётов
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до появления токена."""
+        now = self._clock()
+        self._refill(now)
+        wait = max(0.0, self._blocked_until - now)
+        if self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) / self.rate)
+        return wait
+
+    def take(self):
+        self._refill(self._clock())
+        self._tokens -= 1
+
+    def block(self, seconds: float):
+        """Запрещает выдачу токенов на seconds секунд (например, после 429 от Telegram)."""
+        self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+    async def acquire(self):
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                self.take()
+                return
+            await asyncio.sleep(wait)
+
+
+class MessageSender:
+    """Центральная очередь отправки сообщений в Telegram.
+
+    Запросы выбираются из очереди по приоритету, проходят общий bucket и
+    bucket своего чата. Сообщения одного чата уходят строго по порядку.
+    При flood control (429) запрос повторяется через retry_after секунд.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 3):
+        self.bot = bot
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._deliveries: set = set()
+        self._counter = itertools.count()
+        self.flood_waits = 0
+
+    @property
+    def depth(self) -> int:
+        """Число запросов, ожидающих отправки."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.PriorityQueue()
+            self._chat_locks.clear()
+            self._worker = loop.create_task(self._run())
+
+    async def call(self, chat_id: int, request: Callable[[], Awaitable[Any]],
+                   priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Ставит запрос к Telegram в очередь и ждёт его результата."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((priority, next(self._counter), chat_id, request, future))
+        return await future
+
+    async def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Any:
+        return await self.call(chat_id, lambda: self.bot.send_message(chat_id, text, **kwargs), priority)
+
+    async def edit_text(self, message: Any, text: str, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Any:
+        return await self.call(message.chat.id, lambda: message.edit_text(text, **kwargs), priority)
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            await self._global_bucket.acquire()
+            task = asyncio.create_task(self._deliver(*item))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _deliver(self, priority: int, seq: int, chat_id: int,
+                       request: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            bucket = self._chat_bucket(chat_id)
+            for attempt in range(self.max_retries + 1):
+                await bucket.acquire()
+                try:
+                    result = await request()
+                except TelegramRetryAfter as e:
+                    self.flood_waits += 1
+                    if attempt == self.max_retries:
+                        if not future.done():
+                            future.set_exception(e)
+                        return
+                    bucket.block(e.retry_after)
+                    self._global_bucket.block(e.retry_after)
+                    continue
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+                if not future.done():
+                    future.set_result(result)
+                return
+
+    async def close(self):
+        """Дожидается отправки поставленных сообщений и останавливает обработчик очереди."""
+        if self._worker is None:
+            return
+        while self._queue is not None and not self._queue.empty():
+            await asyncio.sleep(0.05)
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+
+class LiveMessage:
+    """Сообщения, которые дописываются по мере готовности данных.
+
+    update() публикует промежуточный вид не чаще раза в interval секунд,
+    finish() — окончательный. Уже отправленные части редактируются только
+    при изменении текста, недостающие досылаются, лишние удаляются.
+    """
+
+    def __init__(self, sender: MessageSender, chat_id: int, interval: float = 1.0,
+                 messages: Optional[Sequence[Any]] = None, clock: Callable[[], float] = time.monotonic):
+        self.sender = sender
+        self.chat_id = chat_id
+        self.interval = interval
+        self._clock = clock
+        self.messages: List[Any] = list(messages or [])
+        # Что сейчас показано в каждом сообщении; у переданных заглушек содержимое неизвестно
+        self._shown: List[Optional[Tuple[str, Dict[str, Any]]]] = [None] * len(self.messages)
+        self._published_at: Optional[float] = None
+
+    async def update(self, parts: List[str], **kwargs) -> bool:
+        """Показывает промежуточный результат, если с прошлой правки прошло достаточно времени."""
+        if self._published_at is not None and self._clock() - self._published_at < self.interval:
+            return False
+        await self._publish(parts, kwargs)
+        return True
+
+    async def finish(self, parts: List[str], **kwargs):
+        """Показывает окончательный результат."""
+        await self._publish(parts, kwargs)
+
+    async def _publish(self, parts: List[str], kwargs: Dict[str, Any]):
+        self._published_at = self._clock()
+        for index, text in enumerate(parts):
+            view = (text, kwargs)
+            if index < len(self.messages):
+                if self._shown[index] == view:
+                    continue
+                try:
+                    await self.sender.edit_text(self.messages[index], text, **kwargs)
+                except TelegramBadRequest:
+                    # Сообщение удалено пользователем или не изменилось — показываем дальше как есть
+                    pass
+                self._shown[index] = view
+            else:
+                self.messages.append(await self.sender.send_message(self.chat_id, text, **kwargs))
+                self._shown.append(view)
+        for message in self.messages[len(parts):]:
+            try:
+                await self.sender.call(self.chat_id, message.delete)
+            except TelegramBadRequest:
+                pass
+        del self.messages[len(parts):]
+        del self._shown[len(parts):]
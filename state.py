@@ -0,0 +1,123 @@
+# state.py
+# Хранилище состояния бота (подписки пользователей и аренды задач): SQLite или Redis
+# Bot state storage (user subscriptions and job leases): SQLite or Redis
+
+import json
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class StateBackend:
+    """Общий интерфейс хранилища состояния.
+
+    Пользователи хранятся как JSON-словари по user_id. Аренда (lease) —
+    именованная блокировка с TTL: пока владелец её продлевает, другие
+    экземпляры бота получить её не могут.
+    """
+
+    async def load_users(self) -> Dict[int, Dict[str, Any]]:
+        """Все пользователи одним чтением — для восстановления при старте."""
+        raise NotImplementedError
+
+    async def save_users(self, users: Dict[int, Dict[str, Any]]):
+        raise NotImplementedError
+
+    async def save_user(self, user_id: int, data: Dict[str, Any]):
+        await self.save_users({user_id: data})
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Берёт или продлевает аренду; False, если она у другого владельца."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class SQLiteStateBackend(StateBackend):
+    """Состояние в файле SQLite; подходит для одного экземпляра или нескольких на одной машине.
+
+    Соединение открывается при первом обращении.
+    """
+
+    def __init__(self, db_path: str, clock: Callable[[], float] = time.time):
+        self.db_path = db_path
+        self._clock = clock
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, timeout=10)
+            self._db.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        return self._db
+
+    async def load_users(self) -> Dict[int, Dict[str, Any]]:
+        rows = self._connect().execute("SELECT user_id, data FROM users")
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    async def save_users(self, users: Dict[int, Dict[str, Any]]):
+        db = self._connect()
+        db.executemany("INSERT OR REPLACE INTO users VALUES (?, ?)",
+                       [(user_id, json.dumps(data)) for user_id, data in users.items()])
+        db.commit()
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        db = self._connect()
+        now = self._clock()
+        cursor = db.execute(
+            "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE "
+            "SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+            (name, owner, now + ttl, now),
+        )
+        db.commit()
+        return cursor.rowcount == 1
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class RedisStateBackend(StateBackend):
+    """Состояние в Redis (или совместимом сервере) для нескольких экземпляров бота.
+
+    client — асинхронный клиент с API redis.asyncio (hgetall, hset, set, get, pexpire).
+    """
+
+    def __init__(self, client: Any, prefix: str = "release_bot"):
+        self.client = client
+        self.prefix = prefix
+
+    @staticmethod
+    def _text(value: Any) -> Any:
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def load_users(self) -> Dict[int, Dict[str, Any]]:
+        raw = await self.client.hgetall(f"{self.prefix}:users")
+        return {int(self._text(user_id)): json.loads(self._text(data)) for user_id, data in raw.items()}
+
+    async def save_users(self, users: Dict[int, Dict[str, Any]]):
+        if users:
+            await self.client.hset(f"{self.prefix}:users",
+                                   mapping={str(user_id): json.dumps(data) for user_id, data in users.items()})
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        key = f"{self.prefix}:lease:{name}"
+        ttl_ms = max(1, int(ttl * 1000))
+        if await self.client.set(key, owner, nx=True, px=ttl_ms):
+            return True
+        # Владелец продлевает свою аренду
+        if self._text(await self.client.get(key)) == owner:
+            await self.client.pexpire(key, ttl_ms)
+            return True
+        return False
+
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close is not None:
+            await close()
@@ -3,6 +3,24 @@ import pytest
 from unittest.mock import AsyncMock, patch
 import bot
 from bot import extract_text_from_comment, check_mr_target_branch
+from cache import MergeRequestInfo
+
+
+@pytest.fixture(autouse=True)
+def memory_state(monkeypatch):
+    """Состояние бота в SQLite в памяти, чтобы тесты не создавали файлов."""
+    from state import SQLiteStateBackend
+    monkeypatch.setattr(bot, 'state_backend', SQLiteStateBackend(":memory:"))
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    bot.issue_cache.clear()
+    bot.mr_cache.clear()
+    yield
+    bot.issue_cache.clear()
+    bot.mr_cache.clear()
+
 
 @pytest.mark.asyncio
 async def test_extract_text_from_comment():
@@ -35,6 +53,8 @@ async def test_check_mr_target_branch():
         result = await check_mr_target_branch("https://gitlab.com/group/project/-/merge_requests/123")
         assert result is True
 
+        # Ответ GitLab кэшируется, поэтому сбрасываем кэш перед повторной проверкой
+        bot.mr_cache.clear()
         mock_resp.json.return_value = {"target_branch": "develop"}
         result = await check_mr_target_branch("https://gitlab.com/group/project/-/merge_requests/123")
         assert result is False
@@ -86,20 +106,722 @@ async def test_get_services_from_issue_branch_based(monkeypatch):
         }
     }
 
-    # Мокаем check_mr_target_branch на True
-    async def mock_check_true(*args, **kwargs):
-        return True
-    monkeypatch.setattr(bot, 'check_mr_target_branch', mock_check_true)
+    # Мокаем пакетный запрос MR: целевая ветка совпадает
+    async def mock_fetch_target(project_path, iids):
+        return {"1": MergeRequestInfo("main", "merged")}
+    monkeypatch.setattr(bot, 'fetch_project_merge_requests', mock_fetch_target)
 
     services = await bot.get_services_from_issue(issue)
     assert "Cote" in services
     assert "Django" not in services
 
-    # Мокаем на False
-    async def mock_check_false(*args, **kwargs):
-        return False
-    monkeypatch.setattr(bot, 'check_mr_target_branch', mock_check_false)
+    # Мокаем на другую ветку
+    async def mock_fetch_other(project_path, iids):
+        return {"1": MergeRequestInfo("develop", "merged")}
+    monkeypatch.setattr(bot, 'fetch_project_merge_requests', mock_fetch_other)
 
     services = await bot.get_services_from_issue(issue)
     assert "Django" in services
-    assert "Cote" not in services
\ No newline at end of file
+    assert "Cote" not in services
+
+@pytest.mark.asyncio
+async def test_upstream_client_reuses_session():
+    """Проверка, что на каждый хост создаётся одна долгоживущая сессия."""
+    from upstream import UpstreamClient, UpstreamSettings
+    client = UpstreamClient({"jira": UpstreamSettings(), "gitlab": UpstreamSettings()})
+
+    jira_session = client.session("jira")
+    assert client.session("jira") is jira_session
+    assert client.session("gitlab") is not jira_session
+
+    await client.close()
+    assert jira_session.closed
+
+@pytest.mark.asyncio
+async def test_fetch_issues_for_releases_bulk(monkeypatch):
+    """Проверка пакетной загрузки: один JQL на группу релизов, группировка по fixVersions."""
+    monkeypatch.setattr(bot, 'JIRA_BULK_RELEASES', 2)
+    queries = []
+
+    async def fake_collect(jql, fields):
+        queries.append(jql)
+        if '"broken"' in jql:
+            raise RuntimeError("jira is down")
+        return [bot.parse_issue(raw) for raw in [
+            {"key": "A-1", "fields": {"fixVersions": [{"name": "1.0"}, {"name": "2.0"}]}},
+            {"key": "A-2", "fields": {"fixVersions": [{"name": "2.0"}]}},
+        ]]
+    monkeypatch.setattr(bot, 'collect_jira_issues', fake_collect)
+
+    results = await bot.fetch_issues_for_releases(["2.0", "1.0", "broken"])
+    assert queries[0] == 'fixVersion in ("2.0", "1.0")'
+    assert len(queries) == 2
+    assert [[i.key for i in issues] for issues in results] == [["A-1", "A-2"], ["A-1"], []]
+
+
+class FakeResponse:
+    def __init__(self, data, status=200):
+        self.status = status
+        self._data = data
+
+    async def json(self):
+        return self._data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeJiraSession:
+    """Отдаёт заранее заданные страницы поиска Jira по nextPageToken."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.payloads = []
+
+    def post(self, url, json=None, **kwargs):
+        self.payloads.append(json)
+        return FakeResponse(self.pages[json.get("nextPageToken")])
+
+
+@pytest.mark.asyncio
+async def test_iter_jira_issue_pages_follows_next_page_token(monkeypatch):
+    """Проверка постраничной загрузки задач через nextPageToken/isLast."""
+    fake_session = FakeJiraSession({
+        None: {"issues": [{"key": "A-1"}], "nextPageToken": "p2", "isLast": False},
+        "p2": {"issues": [{"key": "A-2"}], "nextPageToken": "p3", "isLast": False},
+        "p3": {"issues": [{"key": "A-3"}], "isLast": True},
+    })
+    monkeypatch.setattr(bot.http_client, 'session', lambda name: fake_session)
+
+    pages = [page async for page in bot.iter_jira_issue_pages('fixVersion = "1.0"', ["summary"])]
+    assert pages == [[{"key": "A-1"}], [{"key": "A-2"}], [{"key": "A-3"}]]
+    assert [p.get("nextPageToken") for p in fake_session.payloads] == [None, "p2", "p3"]
+
+    issues = await bot.fetch_jira_issues("1.0")
+    assert [i.key for i in issues] == ["A-1", "A-2", "A-3"]
+
+
+def test_ttl_cache_expiry_and_lru():
+    """Проверка TTL, вытеснения LRU и счётчиков попаданий."""
+    from cache import TTLCache
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a").value == 1
+    cache.set("c", 3)
+    assert cache.peek("b") is None
+
+    now[0] = 11
+    entry = cache.get("a")
+    assert not cache.is_fresh(entry)
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 1, "stale_hits": 1, "evictions": 1}
+
+
+@pytest.mark.asyncio
+async def test_release_cache_refreshes_incrementally(monkeypatch):
+    """Проверка кэша задач релиза: повторный запрос из кэша, по истечении TTL — только изменения."""
+    now = [0.0]
+    monkeypatch.setattr(bot.issue_cache, '_clock', lambda: now[0])
+    queries = []
+
+    async def fake_pages(jql, fields):
+        queries.append(jql)
+        if "updated" in jql:
+            yield [{"key": "A-2", "fields": {"summary": "changed"}}, {"key": "A-3", "fields": {}}]
+        else:
+            yield [{"key": "A-1", "fields": {}}, {"key": "A-2", "fields": {"summary": "old"}}]
+    monkeypatch.setattr(bot, 'iter_jira_issue_pages', fake_pages)
+
+    assert [i.key for i in await bot.fetch_jira_issues("1.0")] == ["A-1", "A-2"]
+    await bot.fetch_jira_issues("1.0")
+    assert len(queries) == 1
+
+    now[0] = bot.JIRA_CACHE_TTL + 1
+    issues = await bot.fetch_jira_issues("1.0")
+    assert queries[1] == 'fixVersion = "1.0" AND updated >= -3m'
+    assert [i.key for i in issues] == ["A-1", "A-2", "A-3"]
+    assert issues[1].summary == "changed"
+
+
+def test_merge_request_cache_ttl_by_state(tmp_path):
+    """Проверка кэша MR: слитые хранятся дольше открытых и переживают перезапуск через SQLite."""
+    from cache import MergeRequestCache, MergeRequestInfo
+    now = [0.0]
+    db_path = str(tmp_path / "mr.sqlite")
+    cache = MergeRequestCache(open_ttl=10, final_ttl=1000, db_path=db_path, clock=lambda: now[0])
+    cache.set("group/backend", "1", MergeRequestInfo("main", "merged"))
+    cache.set("group/backend", "2", MergeRequestInfo("main", "opened"))
+
+    now[0] = 20
+    assert cache.get("group/backend", "1") == MergeRequestInfo("main", "merged")
+    assert cache.get("group/backend", "2") is None
+    cache.close()
+
+    restored = MergeRequestCache(open_ttl=10, final_ttl=1000, db_path=db_path, clock=lambda: now[0])
+    assert restored.get("group/backend", "1") == MergeRequestInfo("main", "merged")
+    restored.close()
+
+
+@pytest.mark.asyncio
+async def test_resolve_merge_requests_batches_by_project(monkeypatch):
+    """Проверка пакетного разрешения MR: один запрос на проект, закэшированные MR не запрашиваются."""
+    bot.mr_cache.set("group/api", "7", MergeRequestInfo("main", "merged"))
+    calls = []
+
+    async def fake_fetch(project_path, iids):
+        calls.append((project_path, iids))
+        return {iid: MergeRequestInfo("main", "opened") for iid in iids if iid != "3"}
+    monkeypatch.setattr(bot, 'fetch_project_merge_requests', fake_fetch)
+
+    urls = [
+        "https://gitlab.com/group/backend/-/merge_requests/2",
+        "https://gitlab.com/group/backend/-/merge_requests/3",
+        "https://gitlab.com/group/backend/-/merge_requests/10",
+        "https://gitlab.com/group/api/-/merge_requests/7",
+        "https://example.com/not-an-mr",
+    ]
+    resolved = await bot.resolve_merge_requests(urls)
+
+    assert calls == [("group/backend", ["2", "3", "10"])]
+    assert resolved[urls[0]] == MergeRequestInfo("main", "opened")
+    assert resolved[urls[1]] is None
+    assert resolved[urls[3]] == MergeRequestInfo("main", "merged")
+    assert resolved[urls[4]] is None
+
+
+def test_service_matcher_finds_overlapping_rules():
+    """Проверка матчера: перекрывающиеся и вложенные шаблоны находятся за один проход."""
+    from matcher import ServiceMatcher
+    rules = [
+        {"pattern": "microbackend/bettingservice/", "service": "BettingService"},
+        {"pattern": "bettingservice/", "service": "Betting"},
+        {"pattern": "micro", "service": "Micro"},
+        {"pattern": "CPS", "service": "Copi"},
+    ]
+    matcher = ServiceMatcher(rules)
+
+    assert matcher.match("see microbackend/bettingservice/-/merge_requests/1") == [0, 1, 2]
+    assert matcher.match("deploy cps") == [3]
+    assert matcher.match("nothing here") == []
+    assert matcher.extract_urls("mr https://gitlab.com/a/-/merge_requests/1 done") == [
+        "https://gitlab.com/a/-/merge_requests/1"
+    ]
+
+
+def test_parse_issue_classifies_once():
+    """Проверка разбора задачи: статус, реворки и план сервисов вычисляются при загрузке."""
+    issue = bot.parse_issue({
+        "key": "A-1",
+        "fields": {
+            "summary": "Fix",
+            "status": {"name": "In Review"},
+            "customfield_11087": "4",
+            "fixVersions": [{"name": "1.0"}],
+            "comment": {"comments": [{"body": "fortunewheelservice/ merged"}]},
+        },
+    })
+    assert issue.is_review and not issue.is_deploy
+    assert issue.rework == 4.0 and issue.has_high_rework
+    assert issue.fix_versions == ("1.0",)
+    assert issue.service_plan == [("service", "FortuneWheelService")]
+    assert not hasattr(issue, "__dict__")
+
+    from models import summarize_issues
+    summary = summarize_issues([issue, bot.parse_issue({"key": "A-2", "fields": {"status": {"name": "Deploy"}}})])
+    assert (summary.total, summary.review, summary.high_rework) == (2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_message_sender_priority_and_retry_after():
+    """Проверка очереди отправки: интерактивные сообщения раньше фоновых, 429 повторяется после retry_after."""
+    import asyncio
+    from aiogram.exceptions import TelegramRetryAfter
+    from sender import MessageSender, PRIORITY_BACKGROUND
+
+    class FakeBot:
+        def __init__(self):
+            self.sent = []
+            self.flooded = False
+
+        async def send_message(self, chat_id, text, **kwargs):
+            if text == "flood" and not self.flooded:
+                self.flooded = True
+                raise TelegramRetryAfter(method=None, message="Flood control", retry_after=0)
+            self.sent.append(text)
+            return text
+
+    fake_bot = FakeBot()
+    sender = MessageSender(fake_bot, global_rate=1000, chat_rate=1000, chat_burst=10)
+
+    # Первый запрос занимает обработчик, пока остальные встают в очередь
+    sends = [sender.send_message(1, "first")]
+    sends.append(sender.send_message(2, "report", priority=PRIORITY_BACKGROUND))
+    sends.append(sender.send_message(3, "reply"))
+    sends.append(sender.send_message(4, "flood"))
+    results = await asyncio.gather(*sends)
+    await sender.close()
+
+    assert results == ["first", "report", "reply", "flood"]
+    assert fake_bot.sent.index("reply") < fake_bot.sent.index("report")
+    assert sender.flood_waits == 1
+
+
+def test_token_bucket_rate():
+    """Проверка token bucket: после исчерпания запаса токены появляются со скоростью rate."""
+    from sender import TokenBucket
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+    bucket.take()
+    bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+    now[0] = 0.5
+    assert bucket.delay() == 0
+    bucket.block(3)
+    assert bucket.delay() == pytest.approx(3)
+
+
+@pytest.mark.asyncio
+async def test_auto_report_built_once_per_interval(monkeypatch):
+    """Проверка общего сборщика: снимок один на интервал, новым подписчикам полный отчёт, потом только изменения."""
+    from models import IssueState, ReleaseSnapshot
+    monkeypatch.setattr(bot, 'user_data', {
+        1: {'chat_id': 101, 'interval': 10},
+        2: {'chat_id': 102, 'interval': 10},
+        3: {'chat_id': 103, 'interval': 30},
+        4: {'chat_id': 104, 'interval': 0},
+    })
+    monkeypatch.setattr(bot, 'auto_report_snapshots', {})
+    collects = []
+    sent = []
+
+    def state(status, rework=None):
+        return IssueState("Fix", status, status == "Review", status == "Deploy", rework, str(rework), ("Django",))
+
+    snapshots = [
+        {"1.0": ReleaseSnapshot("h1", {"A-1": state("Open")})},
+        {"1.0": ReleaseSnapshot("h1", {"A-1": state("Open")})},
+        {"1.0": ReleaseSnapshot("h2", {"A-1": state("Review"), "A-2": state("Open", 5)})},
+    ]
+
+    async def fake_collect(previous):
+        collects.append(previous)
+        return snapshots[len(collects) - 1]
+
+    async def fake_send(chat_id, text, **kwargs):
+        sent.append((chat_id, text))
+    monkeypatch.setattr(bot, 'collect_release_snapshots', fake_collect)
+    monkeypatch.setattr(bot.sender, 'send_message', fake_send)
+
+    await bot.run_auto_report(10)
+    assert len(collects) == 1
+    assert sorted(chat_id for chat_id, _ in sent) == [101, 102]
+    assert all("АВТОМАТИЧЕСКАЯ ПРОВЕРКА" in text for _, text in sent)
+
+    sent.clear()
+    await bot.run_auto_report(10)
+    assert sent == []
+
+    await bot.run_auto_report(10)
+    assert sorted(chat_id for chat_id, _ in sent) == [101, 102]
+    text = sent[0][1]
+    assert "👁‍🗨 A-1 → Review" in text
+    assert "🆕 A-2 - Fix" in text
+    assert "⚠️ A-2 - Попыток QA: 5" in text
+
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    monkeypatch.setattr(bot, 'scheduler', AsyncIOScheduler())
+    bot.sync_auto_report_jobs()
+    assert sorted(job.id for job in bot.scheduler.get_jobs()) == ["auto_report_10", "auto_report_30"]
+
+    bot.user_data[3]['interval'] = 0
+    bot.sync_auto_report_jobs()
+    assert [job.id for job in bot.scheduler.get_jobs()] == ["auto_report_10"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_are_coalesced(monkeypatch):
+    """Проверка single-flight: одновременные одинаковые запросы уходят в Jira один раз."""
+    import asyncio
+    calls = []
+
+    async def slow_versions():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return [{"name": "1.0"}]
+    monkeypatch.setattr(bot, 'load_project_versions', slow_versions)
+    monkeypatch.setattr(bot, 'upstream_flight', bot.SingleFlight())
+
+    results = await asyncio.gather(*(bot.fetch_project_versions() for _ in range(5)))
+    assert calls == [1]
+    assert all(r == [{"name": "1.0"}] for r in results)
+    assert results[0] is not results[1]
+    assert bot.upstream_flight.stats() == {"versions": {"calls": 1, "coalesced": 4}}
+
+    # После завершения следующий вызов снова идёт в Jira
+    await bot.fetch_project_versions()
+    assert calls == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_warm_up_prefetches_newest_unreleased(monkeypatch):
+    """Проверка прогрева: берутся самые свежие невыпущенные релизы по startDate."""
+    async def fake_versions():
+        return [
+            {"name": "1.0", "startDate": "2024-01-01", "released": True},
+            {"name": "1.1", "startDate": "2024-02-01"},
+            {"name": "1.2", "startDate": "2024-03-01"},
+            {"name": "old", "startDate": "2023-01-01", "archived": True},
+        ]
+    warmed = []
+
+    async def fake_fetch(release_name):
+        warmed.append(release_name)
+        return []
+
+    async def fake_counts(release_names):
+        return [bot.ReleaseSummary() for _ in release_names]
+    monkeypatch.setattr(bot, 'fetch_project_versions', fake_versions)
+    monkeypatch.setattr(bot, 'fetch_jira_issues', fake_fetch)
+    monkeypatch.setattr(bot, 'fetch_release_counts', fake_counts)
+    monkeypatch.setattr(bot, 'WARMUP_RELEASES', 1)
+
+    assert await bot.warm_up() == 1
+    assert warmed == ["1.2"]
+
+
+@pytest.mark.asyncio
+async def test_release_counts_use_count_queries(monkeypatch):
+    """Проверка счётчиков для выбора релиза: count-запросы и один поиск задач в ревью только с fixVersions."""
+    searches = []
+
+    async def fake_count(jql):
+        return {'fixVersion = "1.0"': 3, 'fixVersion = "2.0"': 0}[jql]
+
+    async def fake_statuses():
+        return ["Code Review"]
+
+    async def fake_collect(jql, fields):
+        searches.append((jql, fields))
+        return [bot.parse_issue({"key": "A-1", "fields": {"fixVersions": [{"name": "1.0"}]}})]
+    monkeypatch.setattr(bot, 'load_issue_count', fake_count)
+    monkeypatch.setattr(bot, 'load_review_statuses', fake_statuses)
+    monkeypatch.setattr(bot, 'collect_jira_issues', fake_collect)
+
+    summaries = await bot.fetch_release_counts(["1.0", "2.0"])
+    assert [(s.total, s.review) for s in summaries] == [(3, 1), (0, 0)]
+    assert searches == [('fixVersion in ("1.0") AND status in ("Code Review")', ["fixVersions"])]
+
+
+class FakeSender:
+    """Записывает отправленные и отредактированные сообщения вместо Telegram."""
+
+    def __init__(self):
+        self.log = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.log.append(("send", text, kwargs.get("reply_markup")))
+        return object()
+
+    async def edit_text(self, message, text, **kwargs):
+        self.log.append(("edit", text, kwargs.get("reply_markup")))
+
+    async def call(self, chat_id, request, priority=0):
+        return await request()
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_releases_list_is_rendered_progressively(monkeypatch):
+    """Проверка выбора релиза: заглушка дополняется по мере ответов Jira, кнопки идут в порядке версий."""
+    import asyncio
+    fake_sender = FakeSender()
+
+    async def fake_versions():
+        return [{"name": "1.0"}, {"name": "2.0"}]
+
+    async def fake_count(jql):
+        if jql == 'fixVersion = "1.0"':
+            await asyncio.sleep(0.02)
+            return 3
+        return 5
+
+    async def fake_statuses():
+        return []
+    monkeypatch.setattr(bot, 'sender', fake_sender)
+    monkeypatch.setattr(bot, 'PROGRESS_EDIT_INTERVAL', 0)
+    monkeypatch.setattr(bot, 'fetch_project_versions', fake_versions)
+    monkeypatch.setattr(bot, 'load_issue_count', fake_count)
+    monkeypatch.setattr(bot, 'load_review_statuses', fake_statuses)
+
+    await bot.send_releases_list(1)
+
+    def buttons(markup):
+        return [row[0].text for row in markup.inline_keyboard] if markup else []
+    assert [(action, buttons(markup)) for action, _, markup in fake_sender.log] == [
+        ("send", []),
+        ("edit", ["2.0 (5 задач)"]),
+        ("edit", ["1.0 (3 задач)", "2.0 (5 задач)"]),
+        ("edit", ["1.0 (3 задач)", "2.0 (5 задач)"]),
+    ]
+    assert fake_sender.log[-1][1] == "📋 Выберите релиз для просмотра задач:"
+
+
+@pytest.mark.asyncio
+async def test_upstream_retries_and_honours_retry_after(monkeypatch):
+    """Проверка повторов: 503 повторяется с задержкой, на 429 ждём Retry-After, POST без флага не повторяется."""
+    import upstream
+    from upstream import UpstreamClient, UpstreamSettings, UpstreamStatusError
+    responses = []
+    sleeps = []
+
+    class Response(FakeResponse):
+        def __init__(self, data, status=200, headers=None):
+            super().__init__(data, status)
+            self.headers = headers or {}
+
+    class Session:
+        def get(self, url, **kwargs):
+            return responses.pop(0)
+        post = get
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+    monkeypatch.setattr(upstream.asyncio, 'sleep', fake_sleep)
+    client = UpstreamClient({"jira": UpstreamSettings(retries=2, backoff_base=0.1)})
+    monkeypatch.setattr(client, 'session', lambda name: Session())
+
+    responses[:] = [Response(None, 503), Response(None, 429, {"Retry-After": "7"}), Response({"ok": True})]
+    assert await client.request_json("jira", "GET", "/x") == {"ok": True}
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 0.1 and sleeps[1] == 7
+
+    responses[:] = [Response(None, 503)]
+    with pytest.raises(UpstreamStatusError):
+        await client.request_json("jira", "POST", "/x")
+    assert responses == []
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast_and_serves_stale_versions(monkeypatch):
+    """Проверка circuit breaker: после серии отказов Jira не опрашивается, список версий берётся из кэша."""
+    from upstream import CircuitBreaker
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=2, reset_timeout=30, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    now[0] = 31
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+    calls = []
+    monkeypatch.setattr(bot.http_client, 'session', lambda name: calls.append(name))
+    monkeypatch.setattr(bot.http_client, 'breakers', {"jira": CircuitBreaker(1, 30, clock=lambda: 0.0)})
+    bot.http_client.breakers["jira"].record_failure()
+    bot.issue_cache.set(("versions", bot.PROJECT_KEY), [{"name": "1.0"}])
+
+    assert await bot.fetch_project_versions() == [{"name": "1.0"}]
+    assert calls == []
+
+
+async def send_jira_webhook(url, payload, secret=None):
+    """Локальный отправитель вебхуков Jira: подписывает тело так же, как Jira."""
+    import json
+    import aiohttp
+    from webhook import sign_body
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Hub-Signature"] = sign_body(secret, body)
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, data=body, headers=headers) as resp:
+            return resp.status
+
+
+@pytest.mark.asyncio
+async def test_jira_webhook_updates_release_index(monkeypatch):
+    """Проверка вебхуков: события Jira меняют индекс, и отчёт строится без запросов к Jira."""
+    from aiohttp.test_utils import TestServer
+    from release_index import ReleaseIndex
+    from webhook import create_webhook_app
+
+    def raw_issue(key, status, versions):
+        return {"key": key, "fields": {
+            "summary": key, "status": {"name": status}, "customfield_11087": None, "updated": "2024-01-01",
+            "comment": {"comments": []}, "fixVersions": [{"name": name} for name in versions],
+        }}
+    index = ReleaseIndex(max_age=600)
+    index.replace_releases(["1.0", "2.0"], [bot.parse_issue(raw_issue("A-1", "Open", ["1.0"]))])
+    monkeypatch.setattr(bot, 'release_index', index)
+    monkeypatch.setattr(bot.http_client, 'session', lambda name: pytest.fail("Jira must not be called"))
+
+    server = TestServer(create_webhook_app("/jira", bot.handle_jira_webhook, secret="s3cret"))
+    await server.start_server()
+    try:
+        url = str(server.make_url("/jira"))
+        event = {"webhookEvent": "jira:issue_updated", "issue": raw_issue("A-2", "Code Review", ["1.0"])}
+        assert await send_jira_webhook(url, event) == 401
+        assert await send_jira_webhook(url, event, secret="s3cret") == 204
+
+        moved = {"webhookEvent": "jira:issue_updated", "issue": raw_issue("A-1", "Open", ["2.0"])}
+        assert await send_jira_webhook(url, moved, secret="s3cret") == 204
+    finally:
+        await server.close()
+
+    assert [issue.key for issue in await bot.fetch_jira_issues("1.0")] == ["A-2"]
+    summaries = await bot.fetch_release_counts(["1.0", "2.0"])
+    assert [(s.total, s.review) for s in summaries] == [(1, 1), (1, 0)]
+
+
+@pytest.mark.asyncio
+async def test_telegram_webhook_mode_checks_secret_and_drains(monkeypatch):
+    """Проверка режима вебхука: чужие запросы отклоняются, принятые обновления дорабатываются при остановке."""
+    import asyncio
+    import aiohttp
+    from aiohttp.test_utils import TestServer
+    fake_sender = FakeSender()
+    monkeypatch.setattr(bot, 'sender', fake_sender)
+    monkeypatch.setattr(bot, 'TELEGRAM_WEBHOOK_SECRET', "tg-secret")
+    monkeypatch.setattr(bot, 'user_data', {})
+
+    update = {"update_id": 1, "message": {
+        "message_id": 1, "date": 0, "text": "/current",
+        "chat": {"id": 42, "type": "private"}, "from": {"id": 7, "is_bot": False, "first_name": "U"},
+    }}
+    server = TestServer(bot.create_telegram_webhook_app())
+    await server.start_server()
+    try:
+        url = str(server.make_url(bot.TELEGRAM_WEBHOOK_PATH))
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json=update) as resp:
+                assert resp.status == 401
+            headers = {"X-Telegram-Bot-Api-Secret-Token": "tg-secret"}
+            async with session.post(url, json=update, headers=headers) as resp:
+                assert resp.status == 200
+        await asyncio.sleep(0)
+        assert await bot.drain_updates(timeout=5)
+    finally:
+        await server.close()
+
+    assert fake_sender.log == [("send", "Используйте /start", None)]
+
+
+class FakeRedis:
+    """Минимальная замена Redis в памяти: хэши, строки с NX/PX и истечение по времени."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.hashes = {}
+        self.values = {}
+
+    def _alive(self, key):
+        item = self.values.get(key)
+        if item is not None and item[1] is not None and item[1] <= self.clock():
+            del self.values[key]
+            item = None
+        return item
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and self._alive(key) is not None:
+            return None
+        self.values[key] = (value, self.clock() + px / 1000 if px else None)
+        return True
+
+    async def get(self, key):
+        item = self._alive(key)
+        return item[0] if item else None
+
+    async def pexpire(self, key, ms):
+        item = self._alive(key)
+        if item is not None:
+            self.values[key] = (item[0], self.clock() + ms / 1000)
+
+
+@pytest.mark.asyncio
+async def test_redis_state_restores_users_and_leases_auto_report(monkeypatch):
+    """Проверка общего состояния: подписки восстанавливаются одним чтением, автоотчёт шлёт один экземпляр."""
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from state import RedisStateBackend
+    now = [0.0]
+    redis = FakeRedis(lambda: now[0])
+    first, second = RedisStateBackend(redis), RedisStateBackend(redis)
+
+    await first.save_user(7, {'chat_id': 70, 'interval': 10, 'job_id': 'auto_report_10'})
+    monkeypatch.setattr(bot, 'state_backend', second)
+    monkeypatch.setattr(bot, 'user_data', {})
+    monkeypatch.setattr(bot, 'scheduler', AsyncIOScheduler())
+    assert await bot.sync_state() == 1
+    assert bot.user_data[7]['chat_id'] == 70
+    assert [job.id for job in bot.scheduler.get_jobs()] == ["auto_report_10"]
+
+    # Аренду держит первый экземпляр, пока продлевает её; после истечения её забирает второй
+    assert await first.acquire_lease("auto_report_10", "a", ttl=900)
+    assert not await second.acquire_lease("auto_report_10", "b", ttl=900)
+    collects = []
+
+    async def fake_collect(previous):
+        collects.append(previous)
+        return {}
+    monkeypatch.setattr(bot, 'collect_release_snapshots', fake_collect)
+    monkeypatch.setattr(bot, 'INSTANCE_ID', "b")
+    await bot.run_auto_report(10)
+    assert collects == []
+
+    now[0] = 901
+    await bot.run_auto_report(10)
+    assert len(collects) == 1
+    assert not await first.acquire_lease("auto_report_10", "a", ttl=900)
+    assert (await first.load_users())[7]['auto_report_baseline'] is True
+
+
+@pytest.mark.asyncio
+async def test_benchmark_against_fake_upstreams(monkeypatch):
+    """Проверка бенчмарка: сценарии проходят на поддельных Jira и GitLab и считают запросы."""
+    import benchmark
+    from fake_upstreams import FakeDataset
+    for name in ('sender', 'state_backend', 'API_URL', 'GITLAB_API_URL', 'JIRA_URL', 'user_data'):
+        monkeypatch.setattr(bot, name, getattr(bot, name))
+
+    dataset = FakeDataset(releases=3, issues_per_release=5, mr_repo=str(bot.SERVICE_PATTERNS[0]["pattern"]))
+    results = await benchmark.run_benchmarks(dataset, iterations=2, jira_latency=0, gitlab_latency=0)
+
+    cold = results["show_release_details.cold"]
+    assert cold["iterations"] == 2 and cold["p50_ms"] <= cold["p99_ms"]
+    assert cold["upstream_calls"] == {"gitlab.merge_requests": 2, "jira.search": 2}
+    assert results["show_release_details.warm"]["upstream_calls"] == {}
+    assert results["get_services_from_issue.cold"]["upstream_calls"] == {"gitlab.merge_requests": 2}
+
+
+@pytest.mark.asyncio
+async def test_load_test_harness_feeds_updates(monkeypatch):
+    """Проверка нагрузочного стенда: обновления проходят через диспетчер, вызовы Telegram записываются."""
+    import loadtest
+    from fake_upstreams import FakeDataset
+    for name in ('bot', 'sender', 'state_backend', 'API_URL', 'GITLAB_API_URL', 'JIRA_URL', 'user_data'):
+        monkeypatch.setattr(bot, name, getattr(bot, name))
+
+    dataset = FakeDataset(releases=2, issues_per_release=3, mr_repo=str(bot.SERVICE_PATTERNS[0]["pattern"]))
+    result = await loadtest.run_load_test(users=3, actions=2, mix=loadtest.parse_mix("check=1,rel=1"),
+                                          dataset=dataset, telegram_chat_rate=0)
+
+    assert result["errors"] == {}
+    assert result["latency"]["count"] == 6
+    assert result["telegram_calls"]["SendMessage"] >= 6
+    assert result["upstream_calls"]["jira.versions"] >= 1
+    with pytest.raises(ValueError):
+        loadtest.parse_mix("check=1,unknown=2")
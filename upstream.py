@@ -0,0 +1,241 @@
+# upstream.py
+# Общий HTTP-клиент для Jira и GitLab: пулы соединений, повторы, circuit breaker и бюджеты времени
+# Shared HTTP client for Jira and GitLab: connection pools, retries, circuit breaker and latency budgets
+
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import aiohttp
+
+# Статусы, при которых идемпотентный запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Крайний срок (time.monotonic) текущего экрана; наследуется задачами, созданными внутри
+_deadline: ContextVar[Optional[float]] = ContextVar("upstream_deadline", default=None)
+
+
+class UpstreamError(Exception):
+    """Внешний сервис ответил ошибкой или недоступен."""
+
+
+class UpstreamStatusError(UpstreamError):
+    """Внешний сервис вернул неуспешный HTTP-статус."""
+
+    def __init__(self, name: str, status: int):
+        super().__init__(f"{name} request failed with status {status}")
+        self.status = status
+
+
+class CircuitOpenError(UpstreamError):
+    """Хост помечен недоступным, запрос не отправлялся."""
+
+
+@contextmanager
+def latency_budget(seconds: Optional[float]) -> Iterator[None]:
+    """Ограничивает суммарное время всех запросов экрана, включая повторы.
+
+    Вложенный бюджет не может продлить внешний. None — без ограничения.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Сколько секунд осталось у текущего экрана (None — бюджет не задан)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After: число секунд или HTTP-дата."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Размыкается после threshold неудач подряд и не пропускает запросы reset_timeout секунд.
+
+    Затем пропускает один пробный запрос: успех замыкает цепь, неудача
+    размыкает её снова.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            self.opened_at = self._clock()
+        self._probing = False
+
+
+@dataclass
+class UpstreamSettings:
+    """Настройки пула соединений для одного внешнего хоста."""
+    pool_limit: int = 20
+    keepalive_timeout: float = 30.0
+    dns_ttl: int = 300
+    timeout: float = 10.0
+    headers: Dict[str, str] = field(default_factory=dict)
+    auth: Optional[aiohttp.BasicAuth] = None
+    retries: int = 2
+    backoff_base: float = 0.2
+    backoff_max: float = 2.0
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+
+
+class UpstreamClient:
+    """Долгоживущие сессии aiohttp: одна сессия и один пул соединений на каждый хост.
+
+    request_json() добавляет поверх сессии повторы идемпотентных запросов с
+    экспоненциальной задержкой и джиттером, учёт Retry-After и circuit breaker
+    на каждый хост.
+    """
+
+    def __init__(self, settings: Dict[str, UpstreamSettings]):
+        self._settings = settings
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(item.breaker_threshold, item.breaker_reset) for name, item in settings.items()
+        }
+
+    def session(self, name: str) -> aiohttp.ClientSession:
+        """Возвращает сессию для хоста, создавая её при первом обращении."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(name)
+        if session is None or session.closed or self._loops.get(name) is not loop:
+            settings = self._settings[name]
+            connector = aiohttp.TCPConnector(
+                limit=settings.pool_limit,
+                limit_per_host=settings.pool_limit,
+                ttl_dns_cache=settings.dns_ttl,
+                keepalive_timeout=settings.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.timeout),
+                headers=settings.headers,
+                auth=settings.auth,
+            )
+            self._sessions[name] = session
+            self._loops[name] = loop
+        return session
+
+    def backoff(self, name: str, attempt: int) -> float:
+        """Задержка перед повтором номер attempt: экспонента с полным джиттером."""
+        settings = self._settings[name]
+        return random.uniform(0, min(settings.backoff_max, settings.backoff_base * 2 ** attempt))
+
+    async def request_json(self, name: str, method: str, url: str, idempotent: Optional[bool] = None,
+                           **kwargs) -> Any:
+        """Выполняет запрос и возвращает JSON успешного ответа.
+
+        Неуспешный статус — UpstreamStatusError, разомкнутая цепь —
+        CircuitOpenError, исчерпанный бюджет экрана — asyncio.TimeoutError.
+        По умолчанию повторяются только GET-запросы.
+        """
+        settings = self._settings[name]
+        breaker = self.breakers[name]
+        if idempotent is None:
+            idempotent = method.upper() == "GET"
+        attempts = settings.retries + 1 if idempotent else 1
+
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{name} is unavailable, circuit is open")
+            budget = remaining_budget()
+            if budget is not None and budget <= 0:
+                raise asyncio.TimeoutError(f"{name} latency budget exhausted")
+            request_kwargs = dict(kwargs)
+            if budget is not None and budget < settings.timeout:
+                request_kwargs["timeout"] = aiohttp.ClientTimeout(total=budget)
+
+            retry_after = None
+            try:
+                async with getattr(self.session(name), method.lower())(url, **request_kwargs) as resp:
+                    if resp.status == 200:
+                        data = await resp.json()
+                        breaker.record_success()
+                        return data
+                    error: Exception = UpstreamStatusError(name, resp.status)
+                    if resp.status == 429:
+                        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                error = e
+            else:
+                if resp.status >= 500:
+                    breaker.record_failure()
+                else:
+                    # 4xx и 429 означают, что хост отвечает
+                    breaker.record_success()
+                if resp.status not in RETRY_STATUSES:
+                    raise error
+
+            if attempt == attempts - 1:
+                raise error
+            delay = retry_after if retry_after is not None else self.backoff(name, attempt)
+            budget = remaining_budget()
+            if budget is not None and delay >= budget:
+                raise error
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        """Закрывает все сессии и их пулы соединений."""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        self._loops.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
@@ -0,0 +1,48 @@
+# webhook.py
+# HTTP-приёмник вебхуков Jira (jira:issue_updated, comment_created и др.)
+# HTTP receiver for Jira webhooks (jira:issue_updated, comment_created, etc.)
+
+import hashlib
+import hmac
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Проверяет подпись X-Hub-Signature вида sha256=<hex> (HMAC-SHA256 тела запроса)."""
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+def sign_body(secret: str, body: bytes) -> str:
+    """Подпись тела запроса так, как её ставит Jira (для локальной отправки тестовых событий)."""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def create_webhook_app(path: str, on_event: Callable[[Dict[str, Any]], Awaitable[Any]],
+                       secret: Optional[str] = None) -> web.Application:
+    """Приложение aiohttp с одним маршрутом POST path.
+
+    Если задан secret, события без верной подписи отклоняются (401).
+    Разобранное событие передаётся в on_event.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        body = await request.read()
+        if secret and not verify_signature(secret, body, request.headers.get("X-Hub-Signature")):
+            return web.Response(status=401)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(payload, dict):
+            return web.Response(status=400)
+        await on_event(payload)
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app